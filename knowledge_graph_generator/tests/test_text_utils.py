@@ -0,0 +1,90 @@
+import pytest
+from text_utils import (
+    BatchStats, SpanIndex, chunk_documents, chunk_text_by_lenth, iter_chunks_by_length,
+    iter_chunks_by_paragraphs, iter_chunks_by_sentences, plan_chunks_by_length, plan_chunks_by_paragraphs,
+    plan_chunks_by_sentences,
+)
+
+WORDS = " ".join(f"w{i}" for i in range(10))
+
+
+def test_streaming_word_chunks_overlap_and_keep_offsets():
+    source = WORDS.encode()
+    chunks = list(iter_chunks_by_length(source, chunk_size=4, overlap=1))
+    assert [chunk for chunk, _, _ in chunks] == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+    for chunk, start, end in chunks:
+        assert source[start:end].decode() == chunk
+
+
+def test_streaming_chunks_read_a_file(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("first para\n\nsecond para\n\nthird para", encoding="utf-8")
+    assert [chunk for chunk, _, _ in iter_chunks_by_paragraphs(str(path), chunk_size=2, overlap=1)] == [
+        "first para\n\nsecond para", "second para\n\nthird para"]
+
+
+def test_streaming_sentences_in_a_non_utf8_file(tmp_path):
+    path = tmp_path / "gbk.txt"
+    path.write_bytes("今天天气很好。我们去公园。然后回家。".encode("gbk"))
+    chunks = iter_chunks_by_sentences(str(path), chunk_size=1, overlap=0, language="ch", encoding="gbk")
+    assert [chunk for chunk, _, _ in chunks] == ["今天天气很好。", "我们去公园。", "然后回家。"]
+
+
+def test_empty_file_has_no_chunks(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"")
+    assert list(iter_chunks_by_length(str(path))) == []
+
+
+def test_invalid_window_is_rejected():
+    with pytest.raises(ValueError):
+        list(iter_chunks_by_length(WORDS.encode(), chunk_size=2, overlap=2))
+
+
+def test_plans_slice_the_text_without_copying():
+    plan = plan_chunks_by_length(WORDS, chunk_size=4, overlap=1)
+    assert list(plan) == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+    starts, ends = plan.to_numpy()
+    assert list(zip(starts.tolist(), ends.tolist())) == plan.spans()
+    assert list(plan_chunks_by_sentences("A. B. C.", chunk_size=2, overlap=1)) == ["A. B.", "B. C."]
+    assert list(plan_chunks_by_paragraphs("a\n\nb")) == ["a", "b"]
+
+
+def test_span_index_caches_units_and_plans():
+    index = SpanIndex(WORDS.encode())
+    plan = index.plan("words", 5, 0)
+    assert index.plan("words", 5, 0) is plan
+    assert bytes(plan[1]) == b"w5 w6 w7 w8 w9"
+    assert len(index.units("words")[0]) == 10
+
+
+@pytest.mark.parametrize("workers,ordered", [(1, True), (2, True), (2, False)])
+def test_chunk_documents_matches_the_single_document_chunker(workers, ordered):
+    documents = [" ".join(f"d{n}w{i}" for i in range(n + 1)) for n in range(40)]
+    stats = BatchStats()
+    results = list(chunk_documents(iter(documents), workers=workers, ordered=ordered, batch_size=3, stats=stats,
+                                   chunk_size=4, overlap=1))
+    if ordered:
+        assert [index for index, _ in results] == list(range(40))
+    assert dict(results) == {i: chunk_text_by_lenth(text, chunk_size=4, overlap=1) for i, text in enumerate(documents)}
+    assert stats.docs == 40
+    assert stats.chunks == sum(len(chunks) for _, chunks in results)
+
+
+def test_chunk_documents_reads_its_input_lazily():
+    read = []
+
+    def documents():
+        for i in range(1000):
+            read.append(i)
+            yield f"doc {i}"
+
+    results = chunk_documents(documents(), workers=2, batch_size=4)
+    assert next(results) == (0, ["doc 0"])
+    assert len(read) < 100
+    results.close()
+
+
+def test_chunk_documents_rejects_unknown_methods():
+    with pytest.raises(ValueError):
+        list(chunk_documents(["text"], method="tokens"))
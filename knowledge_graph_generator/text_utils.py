@@ -2,6 +2,25 @@
 Text processing utilities for the knowledge graph generator.
 """
 ## This module provides functions to process text, including chunking text into manageable pieces with overlap.
+import mmap
+import multiprocessing
+import os
+import queue
+import re
+import time
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+
+# Patterns shared by the streaming chunkers. Words are matched directly, sentences and
+# paragraphs are the regions between separators.
+_WORD_PATTERN = r'\S+'
+_SENTENCE_SEPARATORS = {
+    'en': r'(?<=\.) ',
+    'ch': r'(?<=。)',
+}
+_PARAGRAPH_SEPARATOR = r'\n\n'
 
 def chunk_text_by_lenth(text, chunk_size=500, overlap=50):
     """
@@ -141,4 +160,403 @@ def chunk_text_by_paragraphs(text, chunk_size=1, overlap=0):
             chunks.append(final_chunk)
             break
     
-    return chunks
\ No newline at end of file
+    return chunks
+
+
+## Streaming chunkers: read from a file path or a bytes-like buffer (e.g. mmap) and yield
+## chunks lazily, so memory stays bounded by chunk_size + overlap instead of the corpus size.
+
+@contextmanager
+def open_text_buffer(source):
+    """
+    Open a text source as a read-only bytes-like buffer.
+
+    Args:
+        source: A file path, or a bytes-like object (bytes, bytearray, memoryview, mmap)
+
+    Yields:
+        A buffer that supports slicing and regex search; file paths are memory-mapped
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        yield source
+        return
+
+    with open(source, 'rb') as f:
+        # mmap refuses empty files
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield buf
+        finally:
+            buf.close()
+
+
+def _compile(pattern, encoding=None):
+    # Patterns over bytes-like buffers are encoded like the buffer
+    return re.compile(pattern.encode(encoding) if encoding else pattern)
+
+
+def _iter_token_spans(buf, pattern):
+    # Spans of every match of the pattern
+    for m in pattern.finditer(buf):
+        yield m.start(), m.end()
+
+
+def _iter_split_spans(buf, pattern):
+    # Spans of the non-empty regions between matches of the pattern
+    start = 0
+    for m in pattern.finditer(buf):
+        if m.start() > start:
+            yield start, m.start()
+        start = m.end()
+    if start < len(buf):
+        yield start, len(buf)
+
+
+def _iter_unit_spans(buf, unit, language='en', encoding='utf-8'):
+    """
+    Lazily yield (start, end) offsets of the words, sentences or paragraphs in buf.
+    Offsets are byte offsets for bytes-like buffers, which are in `encoding`, and
+    character offsets for str.
+    """
+    encoding = None if isinstance(buf, str) else encoding
+    if unit == 'words':
+        return _iter_token_spans(buf, _compile(_WORD_PATTERN, encoding))
+    if unit == 'sentences':
+        separator = _SENTENCE_SEPARATORS.get(language, _SENTENCE_SEPARATORS['en'])
+        return _iter_split_spans(buf, _compile(separator, encoding))
+    if unit == 'paragraphs':
+        return _iter_split_spans(buf, _compile(_PARAGRAPH_SEPARATOR, encoding))
+    raise ValueError(f"Unknown chunk unit: {unit}")
+
+
+def _iter_windows(spans, chunk_size, overlap):
+    """
+    Group unit spans into windows of chunk_size units that overlap by `overlap` units.
+
+    Only the spans of the current window are kept in memory.
+
+    Yields:
+        (start, end) offsets covering each window
+    """
+    if chunk_size <= 0 or not 0 <= overlap < chunk_size:
+        raise ValueError("chunk_size must be positive and overlap must be in [0, chunk_size)")
+
+    window = deque()
+    pending = False  # the window holds units that have not been emitted yet
+    for span in spans:
+        window.append(span)
+        pending = True
+        if len(window) == chunk_size:
+            yield window[0][0], window[-1][1]
+            pending = False
+            for _ in range(chunk_size - overlap):
+                window.popleft()
+    if pending:
+        yield window[0][0], window[-1][1]
+
+
+def _iter_chunks(source, unit, chunk_size, overlap, language='en', encoding='utf-8'):
+    with open_text_buffer(source) as buf:
+        spans = _iter_unit_spans(buf, unit, language, encoding)
+        try:
+            for start, end in _iter_windows(spans, chunk_size, overlap):
+                yield str(buf[start:end], encoding), start, end
+        finally:
+            # Release the regex scanner before the mmap is closed
+            spans.close()
+
+
+def iter_chunks_by_length(source, chunk_size=500, overlap=50, encoding='utf-8'):
+    """
+    Lazily split a file or buffer into chunks of words with overlap.
+
+    Unlike chunk_text_by_lenth, chunks are slices of the source, so the original
+    whitespace is kept.
+
+    Args:
+        source: A file path or a bytes-like buffer (e.g. mmap)
+        chunk_size: The size of each chunk in words
+        overlap: The number of words to overlap between chunks
+        encoding: The text encoding of the source; ASCII-compatible encodings such as
+            'utf-8', 'gbk' or 'gb18030' (separators are matched on the encoded bytes)
+
+    Yields:
+        (chunk, start, end) with the byte offsets of the chunk in the source
+    """
+    return _iter_chunks(source, 'words', chunk_size, overlap, encoding=encoding)
+
+
+def iter_chunks_by_sentences(source, chunk_size=5, overlap=1, language='en', encoding='utf-8'):
+    """
+    Lazily split a file or buffer into chunks of sentences with overlap.
+
+    Args:
+        source: A file path or a bytes-like buffer (e.g. mmap)
+        chunk_size: The number of sentences in each chunk
+        overlap: The number of sentences to overlap between chunks
+        language: 'en' splits on '. ', 'ch' splits on '。'
+        encoding: The text encoding of the source; ASCII-compatible encodings such as
+            'utf-8', 'gbk' or 'gb18030' (separators are matched on the encoded bytes)
+
+    Yields:
+        (chunk, start, end) with the byte offsets of the chunk in the source
+    """
+    return _iter_chunks(source, 'sentences', chunk_size, overlap, language=language, encoding=encoding)
+
+
+def iter_chunks_by_paragraphs(source, chunk_size=1, overlap=0, encoding='utf-8'):
+    """
+    Lazily split a file or buffer into chunks of paragraphs with overlap.
+
+    Args:
+        source: A file path or a bytes-like buffer (e.g. mmap)
+        chunk_size: The number of paragraphs in each chunk
+        overlap: The number of paragraphs to overlap between chunks
+        encoding: The text encoding of the source; ASCII-compatible encodings such as
+            'utf-8', 'gbk' or 'gb18030' (separators are matched on the encoded bytes)
+
+    Yields:
+        (chunk, start, end) with the byte offsets of the chunk in the source
+    """
+    return _iter_chunks(source, 'paragraphs', chunk_size, overlap, encoding=encoding)
+
+
+## Span-based chunk index: unit boundaries are stored as compact offset arrays and chunks are
+## built from offsets on demand, so a chunk plan can be cached and reused without copying text.
+
+def _to_numpy(offsets):
+    import numpy as np
+    # Zero-copy view over the array buffer
+    return np.frombuffer(offsets, dtype=np.int64)
+
+
+class ChunkPlan:
+    """
+    Chunk boundaries over a source, stored as two int64 offset arrays.
+
+    Indexing a plan slices the source lazily: str sources give str slices, bytes-like
+    sources give memoryview slices that share memory with the source.
+    """
+
+    def __init__(self, source, starts, ends):
+        self.source = source
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        start, end = self.starts[i], self.ends[i]
+        if isinstance(self.source, str):
+            return self.source[start:end]
+        return memoryview(self.source)[start:end]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def spans(self):
+        """Return the chunk boundaries as a list of (start, end) offsets."""
+        return list(zip(self.starts, self.ends))
+
+    def to_numpy(self):
+        """Return (starts, ends) as NumPy int64 arrays sharing memory with the plan."""
+        return _to_numpy(self.starts), _to_numpy(self.ends)
+
+
+class SpanIndex:
+    """
+    Offsets of the words, sentences and paragraphs of a text.
+
+    Each unit is segmented in a single pass the first time it is needed and kept as a
+    pair of int64 arrays; chunk plans built on top of it are cached per parameters.
+
+    Args:
+        source: The text, or a bytes-like buffer (offsets are then byte offsets)
+        language: Sentence splitting language, 'en' or 'ch'
+        encoding: The text encoding of a bytes-like source
+    """
+
+    def __init__(self, source, language='en', encoding='utf-8'):
+        self.source = source
+        self.language = language
+        self.encoding = encoding
+        self._units = {}
+        self._plans = {}
+
+    def units(self, unit):
+        """
+        Return the (starts, ends) offset arrays of a unit.
+
+        Args:
+            unit: 'words', 'sentences' or 'paragraphs'
+        """
+        if unit not in self._units:
+            starts, ends = array('q'), array('q')
+            for start, end in _iter_unit_spans(self.source, unit, self.language, self.encoding):
+                starts.append(start)
+                ends.append(end)
+            self._units[unit] = (starts, ends)
+        return self._units[unit]
+
+    def plan(self, unit, chunk_size, overlap):
+        """
+        Return the chunk plan grouping chunk_size units with `overlap` units of overlap.
+        """
+        key = (unit, chunk_size, overlap)
+        if key not in self._plans:
+            unit_starts, unit_ends = self.units(unit)
+            starts, ends = array('q'), array('q')
+            for start, end in _iter_windows(zip(unit_starts, unit_ends), chunk_size, overlap):
+                starts.append(start)
+                ends.append(end)
+            self._plans[key] = ChunkPlan(self.source, starts, ends)
+        return self._plans[key]
+
+
+def plan_chunks_by_length(text, chunk_size=500, overlap=50):
+    """
+    Plan word chunks with overlap without copying the text.
+
+    Returns:
+        ChunkPlan with the character offsets of each chunk
+    """
+    return SpanIndex(text).plan('words', chunk_size, overlap)
+
+
+def plan_chunks_by_sentences(text, chunk_size=5, overlap=1, language='en'):
+    """
+    Plan sentence chunks with overlap without copying the text.
+
+    Returns:
+        ChunkPlan with the character offsets of each chunk
+    """
+    return SpanIndex(text, language).plan('sentences', chunk_size, overlap)
+
+
+def plan_chunks_by_paragraphs(text, chunk_size=1, overlap=0):
+    """
+    Plan paragraph chunks with overlap without copying the text.
+
+    Returns:
+        ChunkPlan with the character offsets of each chunk
+    """
+    return SpanIndex(text).plan('paragraphs', chunk_size, overlap)
+
+
+## Batch chunking: fan documents out over a process pool on top of the chunk functions above.
+
+_CHUNKERS = {
+    'length': chunk_text_by_lenth,
+    'sentences': chunk_text_by_sentences,
+    'paragraphs': chunk_text_by_paragraphs,
+}
+
+
+class BatchStats:
+    """Throughput counters filled in by chunk_documents while it runs."""
+
+    def __init__(self):
+        self.docs = 0
+        self.chunks = 0
+        self.started = None
+        self.elapsed = 0.0
+
+    @property
+    def docs_per_sec(self):
+        return self.docs / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return f"<BatchStats(docs={self.docs}, chunks={self.chunks}, docs_per_sec={self.docs_per_sec:.1f})>"
+
+
+def _chunk_document(task):
+    # Runs in the worker process
+    index, text, method, kwargs = task
+    return index, _CHUNKERS[method](text, **kwargs)
+
+
+def _chunk_batch(tasks):
+    # Runs in the worker process
+    return [_chunk_document(task) for task in tasks]
+
+
+def _pool_results(pool, tasks, workers, ordered, batch_size):
+    """
+    Run batches of tasks on the pool with at most workers * 2 batches outstanding, so the
+    input is read only as fast as the workers consume it.
+    """
+    batches = iter(lambda: list(islice(tasks, batch_size)), [])
+    window = workers * 2
+    if ordered:
+        pending = deque()
+        for batch in islice(batches, window):
+            pending.append(pool.apply_async(_chunk_batch, (batch,)))
+        while pending:
+            results = pending.popleft().get()
+            for batch in islice(batches, 1):
+                pending.append(pool.apply_async(_chunk_batch, (batch,)))
+            yield from results
+    else:
+        done = queue.Queue()
+        outstanding = 0
+        for batch in islice(batches, window):
+            pool.apply_async(_chunk_batch, (batch,), callback=done.put, error_callback=done.put)
+            outstanding += 1
+        while outstanding:
+            results = done.get()
+            outstanding -= 1
+            if isinstance(results, BaseException):
+                raise results
+            for batch in islice(batches, 1):
+                pool.apply_async(_chunk_batch, (batch,), callback=done.put, error_callback=done.put)
+                outstanding += 1
+            yield from results
+
+
+def chunk_documents(documents, method='length', workers=None, ordered=True, batch_size=16, stats=None, **chunk_kwargs):
+    """
+    Chunk many documents in parallel over a process pool.
+
+    The input is consumed lazily: at most workers * batch_size * 2 documents are in flight.
+
+    Args:
+        documents: An iterable of texts
+        method: 'length', 'sentences' or 'paragraphs'
+        workers: Number of worker processes, defaults to the CPU count; 1 runs in-process
+        ordered: Yield results in input order, otherwise as soon as they are ready
+        batch_size: Number of documents sent to a worker per task
+        stats: Optional BatchStats updated with docs/chunks done and docs/sec
+        **chunk_kwargs: Passed to the chunk function (chunk_size, overlap, language)
+
+    Yields:
+        (index, chunks) with the position of the document in the input
+    """
+    if method not in _CHUNKERS:
+        raise ValueError(f"Unknown chunk method: {method}")
+    stats = stats if stats is not None else BatchStats()
+    stats.started = time.perf_counter()
+    tasks = ((i, text, method, chunk_kwargs) for i, text in enumerate(documents))
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        results = map(_chunk_document, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = _pool_results(pool, tasks, workers, ordered, max(1, batch_size))
+
+    try:
+        for index, chunks in results:
+            stats.docs += 1
+            stats.chunks += len(chunks)
+            stats.elapsed = time.perf_counter() - stats.started
+            yield index, chunks
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,103 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from utils import get_logging
+logger = get_logging(__file__)
+
+
+class AdmissionController:
+    """
+    Concurrency limiter in front of the LLM backend. Requests beyond max_concurrency wait
+    in a bounded queue ordered by priority (lower runs first, FIFO within a priority).
+    A full queue sheds its lowest-priority request (the newcomer when none ranks below it),
+    and a wait longer than queue_timeout is shed too, both with 429 and a Retry-After hint.
+    Limits are per worker, one controller lives in each event loop.
+    """
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float, retry_after: int = 1,
+                 wait_window: int = 1000) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiters = []  # heap of [priority, seq, future]
+        self.seq = itertools.count()
+        self.waits = deque(maxlen=wait_window)  # recent queue waits, seconds
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _shed(self, reason: str):
+        logger.warning(f"LLM request shed: {reason} (active={self.active}, queued={len(self.waiters)})")
+        return HTTPException(status_code=429, detail=f"LLM backend busy: {reason}",
+                             headers={"Retry-After": str(self.retry_after)})
+
+    async def acquire(self, priority: int = 0):
+        started = time.perf_counter()
+        if self.active < self.max_concurrency and not self.waiters:
+            self.active += 1
+        else:
+            if len(self.waiters) >= self.max_queue:
+                self.rejected += 1
+                victim = max(self.waiters)  # lowest priority, latest arrival
+                if victim[0] <= priority:
+                    raise self._shed("queue full")
+                # make room by shedding the waiter that ranks below the newcomer
+                self.waiters.remove(victim)
+                heapq.heapify(self.waiters)
+                victim[2].set_exception(self._shed("queue full, displaced by a higher priority request"))
+            future = asyncio.get_running_loop().create_future()
+            entry = [priority, next(self.seq), future]
+            heapq.heappush(self.waiters, entry)
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if future.done() and not future.cancelled():
+                    # the slot was handed over just as we gave up, pass it on
+                    self.release()
+                else:
+                    future.cancel()
+                    self.waiters.remove(entry)
+                    heapq.heapify(self.waiters)
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timed_out += 1
+                    raise self._shed("queue timeout")
+                raise
+        self.admitted += 1
+        self.waits.append(time.perf_counter() - started)
+
+    def release(self):
+        # hand the slot straight to the next waiter, so active stays unchanged
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        waits = sorted(self.waits)
+        return {
+            "active": self.active,
+            "queued": len(self.waiters),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_avg_seconds": sum(waits) / len(waits) if waits else 0.0,
+            "wait_p95_seconds": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+            "wait_max_seconds": waits[-1] if waits else 0.0,
+        }
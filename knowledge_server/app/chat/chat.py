@@ -1,12 +1,16 @@
 import re
 import json
+import time
+import asyncio
 from configs import *
 from json_repair import repair_json
 from llama_index.core.llms import ChatMessage, MessageRole
 from llama_index.llms.openai_like import OpenAILike
 import mlflow
 from mlflow.genai.scorers import Correctness, Guidelines
-from mlflow.genai import scorer
+from app.chat.tracing import TraceExporter, parse_sample_rates
+from app.chat.evaluation import EvaluationRunner, llm_predictor, load_dataset
+from metrics import timed, count_error, stage_seconds
 
 
 @staticmethod
@@ -54,84 +58,112 @@ class ChatQuery:
             timeout=TIME_OUT,
             additional_kwargs={"extra_body": {"chat_template_kwargs": {"enable_thinking": False}}},
         )
-        mlflow.set_tracking_uri("http://127.0.0.1:5000")
-    
-    # @mlflow.trace
+        mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+        self.tracer = TraceExporter(
+            experiment_id=MLFLOW_EXPERIMENT_ID,
+            sample_rates=parse_sample_rates(TRACE_SAMPLE_RATES),
+            buffer_size=TRACE_BUFFER_SIZE,
+            batch_size=TRACE_BATCH_SIZE,
+            flush_seconds=TRACE_FLUSH_SECONDS,
+        )
+
+    def _trace(self, endpoint, user_message, output, started_ns, think=True):
+        self.tracer.record(
+            endpoint, {"message": user_message}, {"response": output}, started_ns, time.time_ns(),
+            {"model": MODEL_NAME, "enable_thinking": think},
+        )
+
     def chat_query(self, user_message, **kwargs):
-        mlflow.set_experiment(experiment_id="0")
-        mlflow.llama_index.autolog()
+        sampled = self.tracer.sampled("chat")
+        started_ns = time.time_ns()
         user_prompt = user_message
         messages = [
             ChatMessage(role="assistant", content="你是一个乐于助人的朋友"),
             ChatMessage(role="user", content=user_prompt)
         ]
-        response = self.llm.chat(messages, **kwargs)
+        with timed("llm_chat", "llm"):
+            response = self.llm.chat(messages, **kwargs)
+        if sampled:
+            self._trace("chat", user_message, response.message.content, started_ns)
         # result_str = response.message.content
         # if isinstance(response, str):
         #     response = repair_json(response)
         return response
         
     def chat_query_no_think(self, user_message, **kwargs):
+        sampled = self.tracer.sampled("chat_no_think")
+        started_ns = time.time_ns()
         user_prompt = user_message
         messages = [
             ChatMessage(role="assistant", content="你是一个乐于助人的朋友"),
             ChatMessage(role="user", content=user_prompt)
         ]
-        response = self.llm_2.chat(messages, **kwargs)
+        with timed("llm_chat", "llm"):
+            response = self.llm_2.chat(messages, **kwargs)
         result_str = response.message.content
         print(result_str)
+        if sampled:
+            self._trace("chat_no_think", user_message, result_str, started_ns, think=False)
         # if isinstance(response, str):
         #     response = repair_json(response)
         return response
 
-### below is for mlflow test
-    def predict_fn(self, question: str, **kwargs) -> str:
-        user_prompt = question
-        print(f"user_prompt: {user_prompt}")
+    async def astream_chat_query(self, user_message, think=True, **kwargs):
+        """
+        Stream the answer token by token; yields the text deltas.
+        Closing the generator closes the upstream stream, so the LLM stops generating.
+        """
+        llm = self.llm if think else self.llm_2
+        endpoint = "chat_stream" if think else "chat_no_think_stream"
+        sampled = self.tracer.sampled(endpoint)
+        started_ns = time.time_ns()
+        deltas = []
         messages = [
-            ChatMessage(role="assistant", content="你是一个乐于回答问题的全科医生。你只回答“是” 或 “否”。"),
-            ChatMessage(role="user", content=user_prompt)
+            ChatMessage(role="assistant", content="你是一个乐于助人的朋友"),
+            ChatMessage(role="user", content=user_message)
         ]
-        response = self.llm_2.chat(messages, **kwargs)
-        print(f"response: {response.message.blocks[0].text}")
-        return response.message.blocks[0].text
+        started = time.perf_counter()
+        first_token = True
+        try:
+            stream = await llm.astream_chat(messages, **kwargs)
+        except Exception as e:
+            count_error("llm", e)
+            raise
+        try:
+            async for response in stream:
+                if response.delta:
+                    if first_token:
+                        stage_seconds.labels("llm_first_token").observe(time.perf_counter() - started)
+                        first_token = False
+                    if sampled:
+                        deltas.append(response.delta)
+                    yield response.delta
+        except Exception as e:
+            count_error("llm", e)
+            raise
+        finally:
+            await stream.aclose()
+            stage_seconds.labels("llm_chat_stream").observe(time.perf_counter() - started)
+            if sampled:
+                self._trace(endpoint, user_message, "".join(deltas), started_ns, think=think)
 
-    @scorer
-    def exact_match(outputs: dict, expectations: dict) -> bool:
-        return outputs == expectations["expected_response"]
+### below is for mlflow test
+    async def amlflow_test(self, dataset_path: str = EVAL_DATASET_PATH, max_concurrency: int = EVAL_MAX_CONCURRENCY, **kwargs):
+        """
+        Evaluate the no-think model on a JSONL dataset and log the metrics to MLflow.
+        Runs on the server's event loop: llm_2 reuses its async client, which is bound to that loop.
+        """
+        report = await EvaluationRunner(llm_predictor(self.llm_2), max_concurrency=max_concurrency).arun(load_dataset(dataset_path))
+        metrics = {key: value for key, value in report.items() if key != "results"}
+        await asyncio.to_thread(self._log_mlflow_metrics, dataset_path, metrics)
+        return metrics
 
-    def mlflow_test(self, **kwargs):
-        dataset = [
-            {
-                "inputs": {"question": "我的空腹血糖10mmol，是有糖尿病风险吗？"},
-                "expectations": {"expected_response": "是。"},
-            },
-            {
-                "inputs": {"question": "我头疼，是不是马上要死了？"},
-                "expectations": {
-                    "expected_response": "否。"
-                },
-            },
-            {
-                "inputs": {"question": "我的血压值为150/110，我有高血压风险吗？"},
-                "expectations": {
-                    "expected_response": "是。"
-                },
-            },
-            {
-                "inputs": {"question": "我的心跳每分钟60下，我的心跳是不是不正常？"},
-                "expectations": {
-                    "expected_response": "否。"
-                },
-            },
-        ]
-        results = mlflow.genai.evaluate(
-            data=dataset,
-            predict_fn=self.predict_fn,
-            scorers=[self.exact_match
-            ],
-        )
-        print(results)
+    @staticmethod
+    def _log_mlflow_metrics(dataset_path: str, metrics: dict):
+        with mlflow.start_run(experiment_id=MLFLOW_EXPERIMENT_ID):
+            mlflow.log_param("dataset", dataset_path)
+            mlflow.log_param("model", MODEL_NAME)
+            mlflow.log_metrics(metrics)
 
 if __name__ == "__main__":
     cq = ChatQuery()
@@ -0,0 +1,148 @@
+"""
+Evaluation runner for the chat models.
+
+Loads a JSONL dataset of {"inputs": {"question": ...}, "expectations": {"expected_response": ...}}
+rows, runs the predictions concurrently and reports accuracy, latency percentiles and tokens/sec.
+
+Run from the knowledge_server directory, e.g. against the local stub:
+    python benchmarks/openai_stub.py --port 9000 &
+    python -m app.chat.evaluation --api-base http://127.0.0.1:9000/v1 --concurrency 8
+"""
+import re
+import json
+import time
+import asyncio
+import argparse
+from llama_index.core.llms import ChatMessage
+
+YES_NO_PROMPT = "你是一个乐于回答问题的全科医生。你只回答“是” 或 “否”。"
+
+
+def load_dataset(path: str):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def normalize_answer(text: str) -> str:
+    return re.sub(r"[\s。.!！]+$", "", (text or "").strip())
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def completion_tokens(response):
+    usage = getattr(response.raw, "usage", None) if response.raw is not None else None
+    if isinstance(usage, dict):
+        return usage.get("completion_tokens", 0)
+    return getattr(usage, "completion_tokens", 0) or 0
+
+
+def llm_predictor(llm, system_prompt: str = YES_NO_PROMPT):
+    """
+    Async predict function over a llama_index chat LLM, returns (answer, completion tokens).
+    """
+    async def predict(question: str):
+        messages = [
+            ChatMessage(role="assistant", content=system_prompt),
+            ChatMessage(role="user", content=question)
+        ]
+        response = await llm.achat(messages)
+        return response.message.content, completion_tokens(response)
+    return predict
+
+
+class EvaluationRunner:
+    """
+    Runs predict over a dataset with at most max_concurrency calls in flight and scores
+    each answer by normalized exact match.
+    """
+    def __init__(self, predict, max_concurrency: int = 8) -> None:
+        self.predict = predict
+        self.max_concurrency = max_concurrency
+
+    async def _run_row(self, semaphore, row):
+        question = row["inputs"]["question"]
+        expected = row["expectations"]["expected_response"]
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                answer, tokens = await self.predict(question)
+                error = None
+            except Exception as e:
+                answer, tokens, error = None, 0, str(e)
+            latency = time.perf_counter() - started
+        return {
+            "question": question,
+            "expected": expected,
+            "answer": answer,
+            "correct": error is None and normalize_answer(answer) == normalize_answer(expected),
+            "latency": latency,
+            "tokens": tokens,
+            "error": error,
+        }
+
+    async def arun(self, dataset: list):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self._run_row(semaphore, row) for row in dataset))
+        elapsed = time.perf_counter() - started
+        latencies = [result["latency"] for result in results if result["error"] is None]
+        tokens = sum(result["tokens"] for result in results)
+        return {
+            "total": len(results),
+            "correct": sum(result["correct"] for result in results),
+            "errors": sum(result["error"] is not None for result in results),
+            "accuracy": sum(result["correct"] for result in results) / len(results) if results else 0.0,
+            "latency_p50": percentile(latencies, 0.50),
+            "latency_p95": percentile(latencies, 0.95),
+            "latency_p99": percentile(latencies, 0.99),
+            "tokens_per_second": tokens / elapsed if elapsed else 0.0,
+            "elapsed_seconds": elapsed,
+            "results": results,
+        }
+
+    def run(self, dataset: list):
+        """
+        Run on a new event loop, for scripts. In the server await arun instead: the LLM clients
+        reuse connection pools bound to the server's loop.
+        """
+        return asyncio.run(self.arun(dataset))
+
+
+def main():
+    from configs import MODEL_NAME, LLM_API_BASE, MAX_TOKENS, TIME_OUT, EVAL_DATASET_PATH, EVAL_MAX_CONCURRENCY
+    from llama_index.llms.openai_like import OpenAILike
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=EVAL_DATASET_PATH)
+    parser.add_argument("--api-base", default=LLM_API_BASE)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--concurrency", type=int, default=EVAL_MAX_CONCURRENCY)
+    parser.add_argument("--output", help="write the full report, with per-row results, to this JSON file")
+    args = parser.parse_args()
+
+    llm = OpenAILike(
+        model=args.model,
+        api_base=args.api_base,
+        api_key='EMPTY',
+        is_chat_model=True,
+        temperature=0.6,
+        max_tokens=MAX_TOKENS,
+        timeout=TIME_OUT,
+        additional_kwargs={"extra_body": {"chat_template_kwargs": {"enable_thinking": False}}},
+    )
+    report = EvaluationRunner(llm_predictor(llm), max_concurrency=args.concurrency).run(load_dataset(args.dataset))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"accuracy   {report['accuracy']:.3f} ({report['correct']}/{report['total']}, {report['errors']} errors)")
+    print(f"latency    p50 {report['latency_p50'] * 1000:.1f} ms   p95 {report['latency_p95'] * 1000:.1f} ms   p99 {report['latency_p99'] * 1000:.1f} ms")
+    print(f"throughput {report['tokens_per_second']:.1f} tokens/s over {report['elapsed_seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
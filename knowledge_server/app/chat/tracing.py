@@ -0,0 +1,119 @@
+import os
+import queue
+import random
+import time
+from threading import Thread, Event
+import mlflow
+from utils import get_logging
+logger = get_logging(__file__)
+
+
+def parse_sample_rates(spec: str):
+    """
+    "chat=1.0,chat_stream=0.1" -> {"chat": 1.0, "chat_stream": 0.1}
+    """
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class TraceExporter:
+    """
+    Sampled tracing kept off the request path. Requests only decide sampling and put a record
+    into a bounded buffer (dropped when full); a background thread exports the records to MLflow
+    in batches. Tracker setup also happens in that thread, so a slow tracker never blocks a request.
+    """
+    def __init__(self, experiment_id: str, sample_rates: dict, buffer_size: int = 1000,
+                 batch_size: int = 50, flush_seconds: float = 5) -> None:
+        self.experiment_id = experiment_id
+        self.sample_rates = sample_rates
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.buffer = queue.Queue(maxsize=buffer_size)
+        self.ready = False
+        self.stopped = Event()
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self.pid = None
+        self.thread = None
+
+    def sampled(self, endpoint: str):
+        rate = self.sample_rates.get(endpoint, 0.0)
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def record(self, endpoint: str, inputs, outputs, started_ns: int, ended_ns: int, attributes: dict = None):
+        """
+        Queue one finished call for export. Never blocks; the record is dropped when the buffer is full.
+        """
+        self._ensure_thread()
+        try:
+            self.buffer.put_nowait((endpoint, inputs, outputs, started_ns, ended_ns, attributes or {}))
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        # one exporter thread per worker process
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.thread = Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _setup(self):
+        if not self.ready:
+            mlflow.set_experiment(experiment_id=self.experiment_id)
+            self.ready = True
+
+    def _next_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or (self.stopped.is_set() and self.buffer.empty()):
+                break
+            try:
+                batch.append(self.buffer.get(timeout=min(timeout, 0.5)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _export(self, batch):
+        try:
+            self._setup()
+            for endpoint, inputs, outputs, started_ns, ended_ns, attributes in batch:
+                span = mlflow.start_span_no_context(
+                    name=endpoint, span_type="CHAT_MODEL", inputs=inputs,
+                    attributes=attributes, start_time_ns=started_ns,
+                )
+                span.set_outputs(outputs)
+                span.end(end_time_ns=ended_ns)
+            self.exported += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Error exporting {len(batch)} traces: {e}")
+
+    def _run(self):
+        while not (self.stopped.is_set() and self.buffer.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._export(batch)
+
+    def close(self, timeout: float = 5):
+        """
+        Flush what is buffered, waiting at most timeout seconds.
+        """
+        self.stopped.set()
+        if self.thread is not None and self.pid == os.getpid():
+            self.thread.join(timeout)
+
+    def stats(self):
+        return {
+            "sample_rates": self.sample_rates,
+            "buffered": self.buffer.qsize(),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
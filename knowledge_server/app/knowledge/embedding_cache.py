@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import hashlib
+from array import array
+from threading import Lock
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache on a local SQLite file, keyed by (model name, content hash).
+    Vectors are stored as float32 blobs.
+    """
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, hash))"
+            )
+
+    def get_many(self, model: str, texts: list) -> dict:
+        """
+        Return {index: embedding} for the texts that are already cached.
+        """
+        hashes = [content_hash(text) for text in texts]
+        found = {}
+        with self.lock:
+            # stay under SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                chunk = list(set(hashes[i:i + 500]))
+                rows = self.conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk],
+                ).fetchall()
+                found.update(rows)
+        result = {}
+        for i, h in enumerate(hashes):
+            if h in found:
+                result[i] = array('f', found[h]).tolist()
+        return result
+
+    def put_many(self, model: str, texts: list, embeddings: list) -> None:
+        rows = [(model, content_hash(text), array('f', embedding).tobytes()) for text, embedding in zip(texts, embeddings)]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)", rows)
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,18 @@
+from configs import RRF_K
+from llama_index.core.schema import NodeWithScore
+
+
+def reciprocal_rank_fusion(rankings: dict, top_k: int, k: int = RRF_K):
+    """
+    Merge {backend: [NodeWithScore]} rankings by summing 1 / (k + rank), deduped by disease_name.
+    The fused score replaces the node score; the first node seen for a disease is kept.
+    """
+    fused = {}
+    for results in rankings.values():
+        for rank, item in enumerate(results, start=1):
+            key = item.node.metadata.get("disease_name") or item.node.node_id
+            if key not in fused:
+                fused[key] = [item, 0.0]
+            fused[key][1] += 1.0 / (k + rank)
+    merged = sorted(fused.values(), key=lambda entry: entry[1], reverse=True)[:top_k]
+    return [NodeWithScore(node=item.node, score=score) for item, score in merged]
@@ -0,0 +1,142 @@
+import re
+import math
+import numpy as np
+from array import array
+from threading import Lock
+from llama_index.core.schema import TextNode, NodeWithScore
+
+# CJK runs are tokenized into character unigrams and bigrams, latin/digit runs into words,
+# so no external Chinese segmenter is needed.
+_TOKEN_PATTERN = re.compile(r'[㐀-䶿一-鿿]+|[a-z0-9]+(?:\.[0-9]+)?')
+_CJK_PATTERN = re.compile(r'[㐀-䶿一-鿿]')
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        run = match.group()
+        if _CJK_PATTERN.match(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class KeywordIndex:
+    """
+    In-process BM25 inverted index. Each term has a postings pair of compact arrays
+    (document slots as uint32, term frequencies as uint16). Rows are added, replaced and
+    removed incrementally; removed slots are tombstoned (masked out of scoring and document
+    frequencies) and compacted once they outnumber live ones.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.lock = Lock()
+        self._reset()
+
+    def _reset(self):
+        self.postings = {}       # term -> (array('I') slots, array('H') term frequencies)
+        self.doc_freqs = {}      # term -> number of live slots containing it
+        self.doc_lengths = array('I')
+        self.live = array('B')   # slot -> 1 while the slot holds the current version of a row
+        self.slot_docs = []      # slot -> (row_id, hash, indexed text, node dict) or None when removed
+        self.row_slots = {}      # row_id -> slot
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.row_slots)
+
+    def hashes(self) -> dict:
+        with self.lock:
+            return {row_id: self.slot_docs[slot][1] for row_id, slot in self.row_slots.items()}
+
+    def add(self, row_id: int, content_hash: str, text: str, node: dict) -> None:
+        """
+        Index a row, replacing any previous version of it. node holds id, text and metadata of the result.
+        """
+        with self.lock:
+            self._remove(row_id)
+            self._add(row_id, content_hash, text, node)
+            self._maybe_compact()
+
+    def remove(self, row_id: int) -> None:
+        with self.lock:
+            self._remove(row_id)
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if len(self.slot_docs) > 2 * len(self.row_slots) + 1000:
+            self._compact()
+
+    def _add(self, row_id, content_hash, text, node):
+        slot = len(self.slot_docs)
+        tokens = tokenize(text)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for term, tf in counts.items():
+            if term not in self.postings:
+                self.postings[term] = (array('I'), array('H'))
+            slots, tfs = self.postings[term]
+            slots.append(slot)
+            tfs.append(min(tf, 65535))
+            self.doc_freqs[term] = self.doc_freqs.get(term, 0) + 1
+        self.doc_lengths.append(len(tokens))
+        self.live.append(1)
+        self.slot_docs.append((row_id, content_hash, text, node))
+        self.row_slots[row_id] = slot
+        self.total_length += len(tokens)
+
+    def _remove(self, row_id):
+        slot = self.row_slots.pop(row_id, None)
+        if slot is None:
+            return
+        self.total_length -= self.doc_lengths[slot]
+        for term in set(tokenize(self.slot_docs[slot][2])):
+            self.doc_freqs[term] -= 1
+        self.live[slot] = 0
+        self.slot_docs[slot] = None
+
+    def _compact(self):
+        live = [doc for doc in self.slot_docs if doc is not None]
+        self._reset()
+        for doc in live:
+            self._add(*doc)
+
+    def search(self, query: str, top_k: int = 5):
+        """
+        Return the top_k rows by BM25 score as NodeWithScore.
+        """
+        terms = set(tokenize(query))
+        with self.lock:
+            n_docs = len(self.row_slots)
+            if not n_docs or not terms:
+                return []
+            avg_length = self.total_length / n_docs or 1.0  # every indexed text may be empty
+            lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32).astype(np.float32)
+            norms = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+            scores = np.zeros(len(self.slot_docs), dtype=np.float32)
+            for term in terms:
+                if term not in self.postings:
+                    continue
+                slots, tfs = self.postings[term]
+                slots = np.frombuffer(slots, dtype=np.uint32)
+                tfs = np.frombuffer(tfs, dtype=np.uint16).astype(np.float32)
+                df = self.doc_freqs[term]
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                scores[slots] += idf * tfs * (self.k1 + 1) / (tfs + norms[slots])
+            # tombstoned slots must not take places in the top_k
+            scores[np.frombuffer(self.live, dtype=np.uint8) == 0] = -np.inf
+            top_k = min(top_k, len(scores))
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+            candidates = candidates[np.argsort(-scores[candidates])]
+            results = []
+            for slot in candidates:
+                doc = self.slot_docs[slot]
+                if scores[slot] <= 0 or doc is None:
+                    continue
+                node = doc[3]
+                results.append(NodeWithScore(node=TextNode(id_=node["id"], text=node["text"], metadata=node["metadata"]), score=float(scores[slot])))
+            return results
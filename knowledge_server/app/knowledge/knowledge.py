@@ -8,23 +8,34 @@ from llama_index.core.llms import ChatMessage, MessageRole
 from llama_index.llms.openai_like import OpenAILike
 from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.core import Document,VectorStoreIndex
-from llama_index.core.schema import MetadataMode
+from llama_index.core.schema import MetadataMode, QueryBundle, NodeWithScore
 from llama_index.core.storage import StorageContext
 from llama_index.vector_stores.postgres import PGVectorStore
 import qdrant_client
+from qdrant_client import models as qdrant_models
 import psycopg2
 from llama_index.vector_stores.qdrant import QdrantVectorStore
 from sqlalchemy.orm import Session
 import app.knowledge.knowledge_crud as crud
 import app.knowledge.knowledge_schemas as schemas
 import app.knowledge.knowledge_models as models
-from databases import engine, get_db
-import pandas as pd
+from databases import SessionLocal
 import time
+import asyncio
 import schedule
-from threading import Thread
+from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from fastapi import Depends
 import requests
+import httpx
+from app.knowledge.embedding_cache import EmbeddingCache
+from app.knowledge.query_cache import QueryEmbeddingCache
+from app.knowledge.rerank_client import RerankClient
+from app.knowledge.local_vector_index import LocalVectorIndex
+from app.knowledge.keyword_index import KeywordIndex
+from app.knowledge.fusion import reciprocal_rank_fusion
+from app.knowledge.vector_sync import VectorSyncState, document_id, document_hash
+from metrics import timed, count_error, cache_requests, backend_timeouts
 from utils import get_logging
 logger = get_logging(__file__)
 
@@ -47,23 +58,68 @@ class ContentQuery:
         self.embed_model = OpenAIEmbedding(
             model_name=EMBEDDING_MODEL_NAME,
             api_base=EMBED_API_BASE,
-            api_key='EMPTY')
+            api_key='EMPTY',
+            embed_batch_size=EMBED_BATCH_SIZE)
+        self.embedding_cache = EmbeddingCache(EMBED_CACHE_PATH)
+        self.query_embedding_cache = QueryEmbeddingCache(QUERY_EMBED_CACHE_SIZE, QUERY_EMBED_CACHE_TTL)
+        self.sync_state = VectorSyncState(VECTOR_SYNC_STATE_PATH)
+        self.vector_lock = Lock()  # one build or sync at a time
         
         self.rerank_model = OpenAILike(
             model=RERANK_MODEL_NAME,
             api_base=RERANK_API_BASE,
             api_key='EMPTY')
+        self.rerank_client = RerankClient(
+            RERANK_API_BASE,
+            RERANK_MODEL_NAME,
+            pool_size=RERANK_POOL_SIZE,
+            connect_timeout=RERANK_CONNECT_TIMEOUT,
+            read_timeout=RERANK_READ_TIMEOUT,
+            max_concurrency=RERANK_MAX_CONCURRENCY)
+
+        self.pg_vector_store = self._pg_vector_store(DIAGNOSIS_STANDARD_TABLE_NAME)
+
+        # DIAGNOSIS_STANDARD_TABLE_NAME is an alias pointing at the live collection, see _swap_qdrant_collection
+        self.qdrant_client = qdrant_client.QdrantClient(
+            host="localhost",
+            port=6333
+        )
+        self.qdrant_vector_store = QdrantVectorStore(
+            client=self.qdrant_client,
+            aclient=qdrant_client.AsyncQdrantClient(
+                host="localhost",
+                port=6333
+            ),
+            collection_name=DIAGNOSIS_STANDARD_TABLE_NAME
+        )
+
+        self.local_vector_index = LocalVectorIndex(LOCAL_VECTOR_INDEX_PATH, LOCAL_VECTOR_HNSW_THRESHOLD)
+        if not self.local_vector_index.load():
+            logger.info("Local vector index not built yet.")
+
+        self.keyword_index = KeywordIndex()
+        self.keyword_sync_lock = Lock()
+        self.keyword_generation = None  # sync generation the keyword index was last synced at
+        self.keyword_checked_at = 0.0
+        self.keyword_reloading = False
 
-        self.pg_vector_store = PGVectorStore.from_params(
+        # self.call_build_vector()
+        self.pg_vector_index = VectorStoreIndex.from_vector_store(embed_model=self.embed_model,vector_store = self.pg_vector_store)
+        self.qdrant_vector_index = VectorStoreIndex.from_vector_store(embed_model=self.embed_model,vector_store = self.qdrant_vector_store)
+
+    @staticmethod
+    def _pg_vector_store(table_name: str):
+        return PGVectorStore.from_params(
             database='hospital_standards',
             host=POSTGRES_HOST,
             password=POSTGRES_PASSWD,
             port=5432,
             user=POSTGRES_USER_NAME,
             schema_name=POSTGRES_SCHEMA,
-            table_name=DIAGNOSIS_STANDARD_TABLE_NAME,
+            table_name=table_name,
             embed_dim=1024,
             hybrid_search=True,
+            create_engine_kwargs={"pool_size": PG_POOL_SIZE, "max_overflow": PG_MAX_OVERFLOW},
             hnsw_kwargs={
                 "hnsw_m": 16,
                 "hnsw_ef_construction": 64,
@@ -72,76 +128,322 @@ class ContentQuery:
             },
         )
 
-        self.qdrant_vector_store = QdrantVectorStore(
-            client=qdrant_client.QdrantClient(
-                host="localhost",
-                port=6333
-            ), 
-            collection_name=DIAGNOSIS_STANDARD_TABLE_NAME
+    @staticmethod
+    def _pg_connection():
+        return psycopg2.connect(
+            dbname=POSTGRES_DATABASE,
+            user=POSTGRES_USER_NAME,
+            password=POSTGRES_PASSWD,
+            host=POSTGRES_HOST,
+            port="5432",
+            options=f"-c search_path={POSTGRES_SCHEMA}"
         )
 
-        # self.call_build_vector()
-        self.pg_vector_index = VectorStoreIndex.from_vector_store(embed_model=self.embed_model,vector_store = self.pg_vector_store)
-        self.qdrant_vector_index = VectorStoreIndex.from_vector_store(embed_model=self.embed_model,vector_store = self.qdrant_vector_store)
-
-    # def call_build_vector(self):
-    #     schedule.every().day.at("02:00").do(self.build_up_document_vector(vector_store_type="qdrant"))
-    #     while True:
-    #         schedule.run_pending()
-    #         time.sleep(1)
-    def call_build_vector(self):
-        self.build_up_document_vector('qdrant')
-        self.build_up_document_vector('pgvector')
+    def call_build_vector(self, job=None):
+        if self.sync_keyword_index():
+            self.sync_state.bump_generation()
+        self.build_up_document_vector('qdrant', job=job)
+        self.build_up_document_vector('pgvector', job=job)
+        self.build_up_document_vector('local', job=job)
 
         
 
-    def build_up_document_vector(self, vector_store_type: str, db:Session = next(get_db())):
+    def load_documents(self, db: Session):
+        """
+        Load the diagnosis standards to index as {row_id: Document}, with stable ids per row.
+        """
         sql_result = crud.get_diagnosis_standards_for_vector(db)
-        if not sql_result:
-            raise ValueError("No diagnosis standards found in the database.")
-        logger.info(f"Retrieved {len(sql_result)} diagnosis standards for embedding.")
-        documents = [Document(text=describes, metadata={"disease_name":name, "type_ab":type_ab, "is_emergency":is_emergency, "urgency_level":urgency_level}, excluded_embed_metadata_keys=['disease_name','type_ab','is_emergency','urgency_level'])  for i, (name, describes,type_ab, is_emergency, urgency_level) in enumerate(sql_result)]
-        logger.info(f"Converted to {len(documents)} Document objects for embedding.")
-        for doc in documents:
-            doc_embedding = self.embed_model.get_text_embedding(doc.get_content(metadata_mode=MetadataMode.EMBED))
-            doc.embedding = doc_embedding
-        logger.info("Document embeddings generated.")
-        if vector_store_type == "pgvector":
-            connection = psycopg2.connect(
-                dbname=POSTGRES_DATABASE,
-                user=POSTGRES_USER_NAME,
-                password=POSTGRES_PASSWD,
-                host=POSTGRES_HOST,
-                port="5432",
-                options=f"-c search_path={POSTGRES_SCHEMA}"
-            )
-            connection.autocommit = True
-            table_name = DIAGNOSIS_STANDARD_TABLE_NAME
-            with connection.cursor() as c:
-                c.execute(f"DROP TABLE IF EXISTS data_{table_name}")
-            self.pg_vector_store.add(documents, overwrite=True) 
-            self.pg_vecotr_index = VectorStoreIndex.from_vector_store(embed_model=self.embed_model,vector_store = self.pg_vector_store)
-        elif vector_store_type == "qdrant":
-            qd_client = qdrant_client.QdrantClient(
-                host="localhost",
-                port=6333
-            )
-            qd_client.recreate_collection(  
-                collection_name=DIAGNOSIS_STANDARD_TABLE_NAME,
-                vectors_config={"size": 1024, "distance": "Cosine"}
-            )
-            self.qdrant_vector_store.add(documents, overwrite=True)
-            self.qdrant_vector_index = VectorStoreIndex.from_vector_store(embed_model=self.embed_model,vector_store = self.qdrant_vector_store)
-        logger.info("Document vectors have been built and stored in the vector store.")
+        documents = {row_id: Document(id_=document_id(DIAGNOSIS_STANDARD_TABLE_NAME, row_id), text=describes, metadata={"disease_name":name, "type_ab":type_ab, "is_emergency":is_emergency, "urgency_level":urgency_level}, excluded_embed_metadata_keys=['disease_name','type_ab','is_emergency','urgency_level'])  for (row_id, name, describes, type_ab, is_emergency, urgency_level) in sql_result}
+        return documents
+
+    def build_up_document_vector(self, vector_store_type: str, db: Session = None, job=None):
+        """
+        Fully rebuild a vector store. job is an optional VectorJob receiving progress and
+        cancellation; a cancelled build stops before the live store is swapped.
+        """
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            self._build_up_document_vector(vector_store_type, db, job)
+        finally:
+            if own_session:
+                db.close()
+
+    def _build_up_document_vector(self, vector_store_type: str, db: Session, job=None):
+        with self.vector_lock, timed("vector_rebuild"):
+            documents = self.load_documents(db)
+            if not documents:
+                raise ValueError("No diagnosis standards found in the database.")
+            logger.info(f"Retrieved {len(documents)} diagnosis standards for embedding.")
+            hashes = {row_id: document_hash(doc.text, doc.metadata) for row_id, doc in documents.items()}
+            documents = list(documents.values())
+            if job:
+                job.add_total(len(documents))
+            self.embed_documents(documents, job=job)
+            logger.info("Document embeddings generated.")
+            if job:
+                job.check_cancelled()
+            # Build into a shadow table/collection and swap it in, so searches keep being served
+            shadow_name = f"{DIAGNOSIS_STANDARD_TABLE_NAME}_{int(time.time())}"
+            if vector_store_type == "pgvector":
+                self._swap_pg_table(shadow_name, documents)
+                self.pg_vector_index = VectorStoreIndex.from_vector_store(embed_model=self.embed_model,vector_store = self.pg_vector_store)
+            elif vector_store_type == "qdrant":
+                self._swap_qdrant_collection(shadow_name, documents)
+                self.qdrant_vector_index = VectorStoreIndex.from_vector_store(embed_model=self.embed_model,vector_store = self.qdrant_vector_store)
+            elif vector_store_type == "local":
+                self.local_vector_index.build(documents)
+            self.sync_state.replace(vector_store_type, hashes)
+            logger.info("Document vectors have been built and stored in the vector store.")
+
+    def _swap_pg_table(self, shadow_name: str, documents: list):
+        """
+        Fill data_<shadow_name> and rename it over the live table in one transaction.
+        """
+        shadow_store = self._pg_vector_store(shadow_name)
+        shadow_store.add(documents)
+        shadow_store.close()
+        live_table = f"data_{DIAGNOSIS_STANDARD_TABLE_NAME}"
+        old_table = f"data_{shadow_name}_old"
+        connection = self._pg_connection()
+        try:
+            with connection, connection.cursor() as c:
+                c.execute(f"ALTER TABLE IF EXISTS {live_table} RENAME TO {old_table}")
+                c.execute(f"ALTER TABLE data_{shadow_name} RENAME TO {live_table}")
+                c.execute(f"DROP TABLE IF EXISTS {old_table}")
+        finally:
+            connection.close()
+        logger.info(f"Swapped pgvector table {live_table} to the rebuilt data_{shadow_name}.")
+
+    def _swap_qdrant_collection(self, shadow_name: str, documents: list):
+        """
+        Fill the shadow collection and atomically point the DIAGNOSIS_STANDARD_TABLE_NAME alias at it.
+        """
+        alias = DIAGNOSIS_STANDARD_TABLE_NAME
+        self.qdrant_client.create_collection(
+            collection_name=shadow_name,
+            vectors_config={"size": 1024, "distance": "Cosine"}
+        )
+        QdrantVectorStore(client=self.qdrant_client, collection_name=shadow_name).add(documents)
+
+        old_collections = [a.collection_name for a in self.qdrant_client.get_aliases().aliases if a.alias_name == alias]
+        operations = []
+        if old_collections:
+            operations.append(qdrant_models.DeleteAliasOperation(delete_alias=qdrant_models.DeleteAlias(alias_name=alias)))
+        elif self.qdrant_client.collection_exists(alias):
+            # one-time migration from a plain collection with the alias name
+            self.qdrant_client.delete_collection(alias)
+        operations.append(qdrant_models.CreateAliasOperation(create_alias=qdrant_models.CreateAlias(collection_name=shadow_name, alias_name=alias)))
+        self.qdrant_client.update_collection_aliases(change_aliases_operations=operations)
+        for name in old_collections:
+            self.qdrant_client.delete_collection(name)
+        logger.info(f"Swapped qdrant alias {alias} to collection {shadow_name}.")
+
+    def sync_keyword_index(self, db: Session = None):
+        """
+        Incrementally sync the BM25 keyword index over describes and symptom with the database.
+        Returns the number of rows added, replaced or removed.
+        """
+        with self.keyword_sync_lock:
+            generation = self.sync_state.generation()
+            own_session = db is None
+            db = db or SessionLocal()
+            try:
+                sql_result = crud.get_diagnosis_standards_for_keyword_index(db)
+            finally:
+                if own_session:
+                    db.close()
+            changes = self._sync_keyword_rows(sql_result)
+            self.keyword_generation = generation
+        logger.info(f"Keyword index synced, {changes} rows changed, {len(self.keyword_index)} rows indexed.")
+        return changes
+
+    def _sync_keyword_rows(self, sql_result):
+        indexed = self.keyword_index.hashes()
+        seen = set()
+        changes = 0
+        for (row_id, name, describes, symptom, type_ab, is_emergency, urgency_level) in sql_result:
+            seen.add(row_id)
+            text = f"{describes or ''}\n{symptom or ''}"
+            metadata = {"disease_name":name, "type_ab":type_ab, "is_emergency":is_emergency, "urgency_level":urgency_level}
+            h = document_hash(text + name, metadata)
+            if indexed.get(row_id) == h:
+                continue
+            node = {"id": document_id(DIAGNOSIS_STANDARD_TABLE_NAME, row_id), "text": describes or "", "metadata": metadata}
+            self.keyword_index.add(row_id, h, text, node)
+            changes += 1
+        for row_id in indexed:
+            if row_id not in seen:
+                self.keyword_index.remove(row_id)
+                changes += 1
+        return changes
+
+    def _reload_keyword_index_if_changed(self):
+        """
+        The keyword index lives in each worker's memory while syncs run in one worker; the others
+        pick up the change through the shared sync generation and resync in the background,
+        serving the current index meanwhile. At most one check per second.
+        """
+        now = time.monotonic()
+        if now - self.keyword_checked_at < 1 or self.keyword_reloading:
+            return
+        self.keyword_checked_at = now
+        if self.sync_state.generation() == self.keyword_generation:
+            return
+        self.keyword_reloading = True
+        Thread(target=self._reload_keyword_index, daemon=True).start()
+
+    def _reload_keyword_index(self):
+        try:
+            self.sync_keyword_index()
+        except Exception as e:
+            logger.error(f"Error reloading keyword index: {e}")
+        finally:
+            self.keyword_reloading = False
+
+    def call_sync_vector(self, job=None):
+        db = SessionLocal()
+        try:
+            if self.sync_keyword_index(db):
+                # symptom only changes leave the vector stores untouched, publish them to the other workers
+                self.sync_state.bump_generation()
+            self.sync_document_vector('qdrant', db, job=job)
+            self.sync_document_vector('pgvector', db, job=job)
+            self.sync_document_vector('local', db, job=job)
+        finally:
+            db.close()
+
+    def sync_document_vector(self, vector_store_type: str, db: Session, job=None):
+        """
+        Incrementally sync a vector store with the database: upsert new or changed rows and
+        delete vectors of rows that were removed. Falls back to a full rebuild when the store
+        has no sync state yet.
+        """
+        indexed = self.sync_state.get(vector_store_type)
+        if not indexed:
+            logger.info(f"No sync state for {vector_store_type}, running a full rebuild.")
+            return self.build_up_document_vector(vector_store_type, db, job=job)
+
+        with self.vector_lock, timed("vector_sync"):
+            documents = self.load_documents(db)
+            hashes = {row_id: document_hash(doc.text, doc.metadata) for row_id, doc in documents.items()}
+            changed = [row_id for row_id, h in hashes.items() if indexed.get(row_id) != h]
+            removed = [row_id for row_id in indexed if row_id not in hashes]
+            logger.info(f"Vector sync {vector_store_type}: {len(changed)} new or changed, {len(removed)} removed.")
+            if not changed and not removed:
+                return
+
+            if vector_store_type == "local":
+                # the local index is rewritten as a whole; unchanged rows come from the embedding cache
+                all_documents = list(documents.values())
+                self.embed_documents(all_documents, job=job)
+                self.local_vector_index.build(all_documents)
+                self.sync_state.replace(vector_store_type, hashes)
+                return
+
+            vector_store = self.pg_vector_store if vector_store_type == "pgvector" else self.qdrant_vector_store
+            # embed before touching the store, so a failed embedding leaves the old vectors in place
+            upserts = [documents[row_id] for row_id in changed]
+            if upserts:
+                if job:
+                    job.add_total(len(upserts))
+                self.embed_documents(upserts, job=job)
+            # Qdrant upserts points by their stable id; pgvector does not, so replaced rows are deleted there
+            replaced = changed if vector_store_type == "pgvector" else []
+            stale = [document_id(DIAGNOSIS_STANDARD_TABLE_NAME, row_id) for row_id in removed + replaced if row_id in indexed]
+            if stale:
+                vector_store.delete_nodes(node_ids=stale)
+            if upserts:
+                vector_store.add(upserts)
+            self.sync_state.apply(vector_store_type, {row_id: hashes[row_id] for row_id in changed}, removed)
+
+    def _embed_batch(self, texts: list):
+        """
+        Embed one batch with a single request, retrying only this batch on failure.
+        """
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            try:
+                return self.embed_model.get_text_embedding_batch(texts)
+            except Exception as e:
+                count_error("embedding", e)
+                if attempt == EMBED_MAX_RETRIES:
+                    raise
+                logger.warning(f"Embedding batch of {len(texts)} failed (attempt {attempt + 1}): {e}")
+                time.sleep(2 ** attempt)
 
+    def embed_documents(self, documents: list, batch_size: int = EMBED_BATCH_SIZE, max_concurrency: int = EMBED_MAX_CONCURRENCY, job=None):
+        """
+        Embed documents in batches with at most max_concurrency batches in flight.
+        A new batch is only submitted once a running one finishes.
+        Embeddings already in the local cache are reused and new ones are added to it.
+        Progress is reported to job and cancellation is checked before each batch.
+        """
+        texts = [doc.get_content(metadata_mode=MetadataMode.EMBED) for doc in documents]
+        model_name = self.embed_model.model_name
+        cached = self.embedding_cache.get_many(model_name, texts)
+        for i, embedding in cached.items():
+            documents[i].embedding = embedding
+        missing = [i for i in range(len(texts)) if i not in cached]
+        logger.info(f"Embedding cache: {len(cached)} hits, {len(missing)} misses.")
+        if job:
+            job.advance(len(cached))
+
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            in_flight = {}
+            for batch in batches:
+                if job:
+                    job.check_cancelled()
+                if len(in_flight) >= max_concurrency:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._set_embeddings(documents, texts, in_flight.pop(future), future.result(), job)
+                in_flight[executor.submit(self._embed_batch, [texts[i] for i in batch])] = batch
+            for future in wait(in_flight).done:
+                self._set_embeddings(documents, texts, in_flight[future], future.result(), job)
+        return documents
 
+    def _set_embeddings(self, documents: list, texts: list, batch: list, embeddings: list, job=None):
+        for i, embedding in zip(batch, embeddings):
+            documents[i].embedding = embedding
+        self.embedding_cache.put_many(self.embed_model.model_name, [texts[i] for i in batch], embeddings)
+        if job:
+            job.advance(len(batch))
+
+    def query_bundle(self, query: str):
+        """
+        Build a QueryBundle with the query embedding, served from the query embedding cache when possible.
+        """
+        model_name = self.embed_model.model_name
+        embedding = self.query_embedding_cache.get(model_name, query)
+        cache_requests.labels("query_embedding", "miss" if embedding is None else "hit").inc()
+        if embedding is None:
+            with timed("query_embedding", "embedding"):
+                embedding = self.embed_model.get_query_embedding(query)
+            self.query_embedding_cache.put(model_name, query, embedding)
+        return QueryBundle(query_str=query, embedding=embedding)
+
+    async def aquery_bundle(self, query: str):
+        """
+        Async version of query_bundle.
+        """
+        model_name = self.embed_model.model_name
+        embedding = self.query_embedding_cache.get(model_name, query)
+        cache_requests.labels("query_embedding", "miss" if embedding is None else "hit").inc()
+        if embedding is None:
+            with timed("query_embedding", "embedding"):
+                embedding = await self.embed_model.aget_query_embedding(query)
+            self.query_embedding_cache.put(model_name, query, embedding)
+        return QueryBundle(query_str=query, embedding=embedding)
 
     def embed_search(self, query: str, top_k: int = 5, search_type: str = "hybrid"):
         """
         Perform an embedding-based search on the documents.
         """
         retriever = self.pg_vector_index.as_retriever(similarity_top_k=top_k, vector_store_query_mode=search_type)
-        response = retriever.retrieve(query)
+        query_bundle = self.query_bundle(query)
+        with timed("pgvector_search", "pgvector"):
+            response = retriever.retrieve(query_bundle)
         if response is None:
             raise ValueError("Embedding response is None")
         return response
@@ -152,47 +454,218 @@ class ContentQuery:
         Perform an embedding-based search on the documents.
         """
         retriever = self.qdrant_vector_index.as_retriever(similarity_top_k=top_k)
-        response = retriever.retrieve(query)
+        query_bundle = self.query_bundle(query)
+        with timed("qdrant_search", "qdrant"):
+            response = retriever.retrieve(query_bundle)
         if response is None:
             raise ValueError("Embedding response is None")
         return response
 
+    async def aembed_search(self, query: str, top_k: int = 5, search_type: str = "hybrid"):
+        """
+        Async version of embed_search, served by the asyncpg engine of the pgvector store.
+        """
+        retriever = self.pg_vector_index.as_retriever(similarity_top_k=top_k, vector_store_query_mode=search_type)
+        query_bundle = await self.aquery_bundle(query)
+        with timed("pgvector_search", "pgvector"):
+            response = await retriever.aretrieve(query_bundle)
+        if response is None:
+            raise ValueError("Embedding response is None")
+        return response
+
+    async def aqdrant_embed_search(self, query: str, top_k: int = 5):
+        """
+        Async version of qdrant_embed_search, served by the AsyncQdrantClient.
+        """
+        retriever = self.qdrant_vector_index.as_retriever(similarity_top_k=top_k)
+        query_bundle = await self.aquery_bundle(query)
+        with timed("qdrant_search", "qdrant"):
+            response = await retriever.aretrieve(query_bundle)
+        if response is None:
+            raise ValueError("Embedding response is None")
+        return response
+
+    def local_embed_search(self, query: str, top_k: int = 5):
+        """
+        Perform an embedding-based search on the in-process vector index.
+        """
+        embedding = self.query_bundle(query).embedding
+        with timed("local_search"):
+            return self.local_vector_index.search(embedding, top_k)
+
+    async def alocal_embed_search(self, query: str, top_k: int = 5):
+        """
+        Async version of local_embed_search; only the query embedding awaits.
+        """
+        embedding = (await self.aquery_bundle(query)).embedding
+        with timed("local_search"):
+            return self.local_vector_index.search(embedding, top_k)
+
+    def keyword_search(self, query: str, top_k: int = 5):
+        """
+        Perform a BM25 keyword search over describes and symptom.
+        """
+        self._reload_keyword_index_if_changed()
+        with timed("keyword_search"):
+            return self.keyword_index.search(query, top_k)
+
+    async def afused_search(self, query: str, top_k: int = 5, timeout: float = FUSED_SEARCH_TIMEOUT, dropped: list = None):
+        """
+        Query pgvector hybrid, Qdrant and the local index (when built) concurrently under one deadline,
+        add the in-process keyword index, merge the rankings with reciprocal rank fusion and dedupe
+        by disease_name.
+        Backends that fail or miss the deadline are left out, so partial results are still returned.
+        The query embedding shares the deadline; when it fails, only the keyword index answers.
+        The names of the backends left out are appended to dropped when given.
+        """
+        dropped = dropped if dropped is not None else []
+        self._reload_keyword_index_if_changed()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        rankings = {}
+        try:
+            # embed once, the backends then hit the query cache
+            await asyncio.wait_for(self.aquery_bundle(query), timeout)
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                backend_timeouts.labels("embedding").inc()
+            logger.warning(f"Fused search: query embedding failed ({e!r}), keyword results only.")
+            dropped.append("embedding")
+            if len(self.keyword_index):
+                rankings["keyword"] = self.keyword_search(query, top_k=top_k)
+            return reciprocal_rank_fusion(rankings, top_k)
+        remaining = max(0.0, deadline - loop.time())
+        searches = {
+            "pgvector": self.aembed_search(query, top_k=top_k),
+            "qdrant": self.aqdrant_embed_search(query, top_k=top_k),
+        }
+        if len(self.local_vector_index):
+            searches["local"] = self.alocal_embed_search(query, top_k=top_k)
+        tasks = {asyncio.ensure_future(search): name for name, search in searches.items()}
+        done, pending = await asyncio.wait(tasks, timeout=remaining)
+        for task in pending:
+            task.cancel()
+            backend_timeouts.labels(tasks[task]).inc()
+            dropped.append(tasks[task])
+            logger.warning(f"Fused search: {tasks[task]} missed the {timeout}s deadline.")
+
+        for task in done:
+            if task.exception() is not None:
+                logger.error(f"Fused search: {tasks[task]} failed: {task.exception()}")
+                dropped.append(tasks[task])
+                continue
+            rankings[tasks[task]] = task.result()
+        if len(self.keyword_index):
+            rankings["keyword"] = self.keyword_search(query, top_k=top_k)
+        return reciprocal_rank_fusion(rankings, top_k)
+
+    async def aquery_embeddings(self, queries: list):
+        """
+        Embed many queries, sending all cache misses in one batched embedding call.
+        """
+        model_name = self.embed_model.model_name
+        embeddings = [self.query_embedding_cache.get(model_name, query) for query in queries]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        cache_requests.labels("query_embedding", "hit").inc(len(queries) - len(missing))
+        cache_requests.labels("query_embedding", "miss").inc(len(missing))
+        if missing:
+            # the OpenAI-compatible server embeds queries and texts the same way
+            with timed("query_embedding", "embedding"):
+                new_embeddings = await self.embed_model.aget_text_embedding_batch([queries[i] for i in missing])
+            for i, embedding in zip(missing, new_embeddings):
+                embeddings[i] = embedding
+                self.query_embedding_cache.put(model_name, queries[i], embedding)
+        return embeddings
+
+    async def aqdrant_embed_search_batch(self, queries: list, top_k: int = 5):
+        """
+        Search many queries with a single Qdrant batch query; returns one NodeWithScore list per query.
+        """
+        embeddings = await self.aquery_embeddings(queries)
+        search_requests = [qdrant_models.QueryRequest(query=embedding, limit=top_k, with_payload=True) for embedding in embeddings]
+        with timed("qdrant_search_batch", "qdrant"):
+            responses = await self.qdrant_vector_store.aclient.query_batch_points(
+                collection_name=DIAGNOSIS_STANDARD_TABLE_NAME,
+                requests=search_requests
+            )
+        results = []
+        for response in responses:
+            parsed = self.qdrant_vector_store.parse_to_query_result(response.points)
+            results.append([NodeWithScore(node=node, score=score) for node, score in zip(parsed.nodes, parsed.similarities)])
+        return results
+
 
     def reranker_result(self, query: str, documents: str, top_k: int = 3):
         """
         Using external Reranker model to rerank the documents based on the query.
         """
-        RERANK_API_URL = RERANK_API_BASE
-        HEADERS = {
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": RERANK_MODEL_NAME,
-            "query": query,
-            "documents": documents,
-            "top_n": top_k,
-            "truncate_prompt_tokens": 1,
-            "additional_data": "string",
-            "priority": 0,
-            "additionalProp1": {}
-        }
         try:
-            response = requests.post(
-                RERANK_API_URL + "/rerank",
-                headers=HEADERS,
-                json=data,
-                timeout=100
-            )
-            response.raise_for_status()  # 检查HTTP错误
-            results = response.json()['results']
-            res = []
-            for item in results:
-                res.append(item['document']['text'])
-            return res
+            with timed("rerank"):
+                results = self.rerank_client.rerank(query, documents, top_k)
+            return [item['document']['text'] for item in results]
         except requests.exceptions.RequestException as e:
+            count_error("rerank", e)
+            logger.error(f"Rerank API调用失败: {str(e)}")
+            return {"error": str(e)}
+
+    async def areranker_result(self, query: str, documents: str, top_k: int = 3):
+        """
+        Async version of reranker_result.
+        """
+        try:
+            with timed("rerank"):
+                results = await self.rerank_client.arerank(query, documents, top_k)
+            return [item['document']['text'] for item in results]
+        except httpx.HTTPError as e:
+            count_error("rerank", e)
+            logger.error(f"Rerank API调用失败: {str(e)}")
+            return {"error": str(e)}
+
+    async def areranker_scores(self, query: str, documents: list, top_k: int = 3):
+        """
+        Rerank the documents and return (index into documents, relevance score) pairs in rerank order.
+        """
+        try:
+            with timed("rerank"):
+                results = await self.rerank_client.arerank(query, documents, top_k)
+            return [(item['index'], item['relevance_score']) for item in results]
+        except httpx.HTTPError as e:
+            count_error("rerank", e)
             logger.error(f"Rerank API调用失败: {str(e)}")
             return {"error": str(e)}
 
+    async def areranker_scores_batch(self, pairs: list, top_k: int = 3):
+        """
+        Batch version of areranker_scores; failed pairs return {"error": ...}.
+        """
+        with timed("rerank_batch"):
+            results = await self.rerank_client.arerank_batch(pairs, top_k)
+        response = []
+        for item in results:
+            if isinstance(item, Exception):
+                count_error("rerank", item)
+                logger.error(f"Rerank API调用失败: {str(item)}")
+                response.append({"error": str(item)})
+            else:
+                response.append([(result['index'], result['relevance_score']) for result in item])
+        return response
+
+    async def areranker_batch(self, pairs: list, top_k: int = 3):
+        """
+        Rerank many (query, documents) pairs concurrently; failed pairs return {"error": ...}.
+        """
+        with timed("rerank_batch"):
+            results = await self.rerank_client.arerank_batch(pairs, top_k)
+        response = []
+        for item in results:
+            if isinstance(item, Exception):
+                count_error("rerank", item)
+                logger.error(f"Rerank API调用失败: {str(item)}")
+                response.append({"error": str(item)})
+            else:
+                response.append([result['document']['text'] for result in item])
+        return response
+
 
 if __name__ == "__main__":
     cq = ContentQuery()
@@ -15,7 +15,10 @@ def get_diagnosis_standards(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.DiagnosisStandard).offset(skip).limit(limit).all()
 
 def get_diagnosis_standards_for_vector(db: Session):
-    return db.query(models.DiagnosisStandard.name, models.DiagnosisStandard.describes, models.DiagnosisStandard.type_ab, models.DiagnosisStandard.is_emergency, models.DiagnosisStandard.urgency_level).filter(models.DiagnosisStandard.seek_medical_attention_immediately == 1).all()
+    return db.query(models.DiagnosisStandard.id, models.DiagnosisStandard.name, models.DiagnosisStandard.describes, models.DiagnosisStandard.type_ab, models.DiagnosisStandard.is_emergency, models.DiagnosisStandard.urgency_level).filter(models.DiagnosisStandard.seek_medical_attention_immediately == 1).all()
+
+def get_diagnosis_standards_for_keyword_index(db: Session):
+    return db.query(models.DiagnosisStandard.id, models.DiagnosisStandard.name, models.DiagnosisStandard.describes, models.DiagnosisStandard.symptom, models.DiagnosisStandard.type_ab, models.DiagnosisStandard.is_emergency, models.DiagnosisStandard.urgency_level).filter(models.DiagnosisStandard.seek_medical_attention_immediately == 1).all()
 
 def create_diagnosis_standard(db: Session, diagnosis: schemas.DiagnosisStandardCreate):
     db_diagnosis = models.DiagnosisStandard(**diagnosis.dict())
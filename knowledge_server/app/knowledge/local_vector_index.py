@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import numpy as np
+from threading import Lock
+from llama_index.core.schema import TextNode, NodeWithScore
+
+try:
+    import hnswlib
+except ImportError:  # optional, only needed for tables above the HNSW threshold
+    hnswlib = None
+
+
+class LocalVectorIndex:
+    """
+    In-process vector index over a directory: a normalized float32 matrix memory-mapped
+    from vectors.npy, node texts and metadata in nodes.json, and for tables with at least
+    hnsw_threshold rows an optional HNSW graph in hnsw.bin.
+    Exact search is a vectorized dot product with an argpartition top-k.
+    Indexes rebuilt by another worker process are picked up on the next search.
+    """
+    def __init__(self, path: str, hnsw_threshold: int = 50000) -> None:
+        self.path = path
+        self.hnsw_threshold = hnsw_threshold
+        self.build_lock = Lock()
+        self.state = None  # (vectors, nodes, hnsw graph or None), swapped as a whole on rebuild
+        self.loaded_mtime = None
+        self.checked_at = 0.0
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def __len__(self):
+        self._reload_if_changed()
+        return len(self.state[1]) if self.state else 0
+
+    def load(self) -> bool:
+        """
+        Load the index from disk; returns False when it has not been built yet.
+        """
+        if not os.path.exists(self._file("vectors.npy")):
+            return False
+        mtime = os.stat(self._file("nodes.json")).st_mtime_ns
+        vectors = np.load(self._file("vectors.npy"), mmap_mode='r')
+        with open(self._file("nodes.json"), encoding='utf-8') as f:
+            nodes = json.load(f)
+        if len(vectors) != len(nodes):
+            # caught between the file replacements of a rebuild, retry on the next check
+            return False
+        hnsw = None
+        if hnswlib is not None and os.path.exists(self._file("hnsw.bin")):
+            hnsw = hnswlib.Index(space='ip', dim=vectors.shape[1])
+            hnsw.load_index(self._file("hnsw.bin"), max_elements=len(nodes))
+        self.state = (vectors, nodes, hnsw)
+        self.loaded_mtime = mtime
+        return True
+
+    def build(self, documents: list) -> None:
+        """
+        Write the embedded documents to disk and swap them in; an empty list writes an empty index.
+        """
+        with self.build_lock:
+            os.makedirs(self.path, exist_ok=True)
+            if documents:
+                vectors = np.asarray([doc.embedding for doc in documents], dtype=np.float32)
+            else:
+                # every row was deleted: an empty index, keeping the dimension of the previous one
+                vectors = np.zeros((0, self.state[0].shape[1] if self.state else 0), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms == 0, 1, norms)
+            nodes = [{"id": doc.id_, "text": doc.text, "metadata": doc.metadata} for doc in documents]
+
+            # write next to the live files, then replace them
+            np.save(self._file("vectors.tmp.npy"), vectors)
+            with open(self._file("nodes.tmp.json"), 'w', encoding='utf-8') as f:
+                json.dump(nodes, f, ensure_ascii=False)
+            if hnswlib is not None and len(nodes) >= self.hnsw_threshold:
+                hnsw = hnswlib.Index(space='ip', dim=vectors.shape[1])
+                hnsw.init_index(max_elements=len(nodes), ef_construction=200, M=16)
+                hnsw.add_items(vectors, np.arange(len(nodes)))
+                hnsw.save_index(self._file("hnsw.tmp.bin"))
+                os.replace(self._file("hnsw.tmp.bin"), self._file("hnsw.bin"))
+            elif os.path.exists(self._file("hnsw.bin")):
+                os.remove(self._file("hnsw.bin"))
+            os.replace(self._file("vectors.tmp.npy"), self._file("vectors.npy"))
+            os.replace(self._file("nodes.tmp.json"), self._file("nodes.json"))
+            self.load()
+
+    def _reload_if_changed(self):
+        # at most one stat per second
+        now = time.monotonic()
+        if now - self.checked_at < 1:
+            return
+        self.checked_at = now
+        try:
+            mtime = os.stat(self._file("nodes.json")).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self.loaded_mtime:
+            self.load()
+
+    def search(self, embedding: list, top_k: int = 5):
+        """
+        Return the top_k nodes by cosine similarity to the embedding.
+        """
+        self._reload_if_changed()
+        if self.state is None:
+            raise ValueError("Local vector index has not been built")
+        vectors, nodes, hnsw = self.state
+        top_k = min(top_k, len(nodes))
+        if top_k == 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1
+        if hnsw is not None:
+            hnsw.set_ef(max(64, 2 * top_k))
+            labels, distances = hnsw.knn_query(query, k=top_k)
+            indices, scores = labels[0], 1 - distances[0]
+        else:
+            scores = vectors @ query
+            indices = np.argpartition(-scores, top_k - 1)[:top_k]
+            indices = indices[np.argsort(-scores[indices])]
+            scores = scores[indices]
+        return [
+            NodeWithScore(node=TextNode(id_=nodes[i]["id"], text=nodes[i]["text"], metadata=nodes[i]["metadata"]), score=float(score))
+            for i, score in zip(indices, scores)
+        ]
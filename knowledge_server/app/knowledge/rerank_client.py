@@ -0,0 +1,64 @@
+import asyncio
+import requests
+import httpx
+from requests.adapters import HTTPAdapter
+
+
+class RerankClient:
+    """
+    Keep-alive, pooled client for the rerank API, with a sync session, an async client
+    and a batch entry point that reranks many (query, documents) pairs concurrently.
+    """
+    def __init__(self, api_base: str, model_name: str, pool_size: int = 20, connect_timeout: float = 3,
+                 read_timeout: float = 30, max_concurrency: int = 16) -> None:
+        self.url = api_base + "/rerank"
+        self.model_name = model_name
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_concurrency = max_concurrency
+
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+        self.aclient = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    def _request(self, query: str, documents: list, top_k: int):
+        return {
+            "model": self.model_name,
+            "query": query,
+            "documents": documents,
+            "top_n": top_k,
+        }
+
+    def rerank(self, query: str, documents: list, top_k: int = 3):
+        """
+        Return the reranker results (index, relevance_score, document) for one query.
+        """
+        response = self.session.post(self.url, json=self._request(query, documents, top_k), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['results']
+
+    async def arerank(self, query: str, documents: list, top_k: int = 3):
+        response = await self.aclient.post(self.url, json=self._request(query, documents, top_k))
+        response.raise_for_status()
+        return response.json()['results']
+
+    async def arerank_batch(self, pairs: list, top_k: int = 3):
+        """
+        Rerank (query, documents) pairs concurrently over the pool, at most max_concurrency at a time.
+        Failed pairs come back as the raised exception.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(query, documents):
+            async with semaphore:
+                return await self.arerank(query, documents, top_k)
+
+        return await asyncio.gather(*(run(query, documents) for query, documents in pairs), return_exceptions=True)
+
+    async def aclose(self):
+        self.session.close()
+        await self.aclient.aclose()
@@ -0,0 +1,163 @@
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+from app.knowledge.query_cache import normalize_query
+
+_NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+
+def prompt_numbers(prompt: str) -> tuple:
+    return tuple(_NUMBER_PATTERN.findall(prompt))
+
+
+class _Partition:
+    """
+    Normalized embeddings of the cached prompts sharing (namespace, model, temperature, numbers),
+    in a preallocated matrix that doubles when full (prompts with distinct numbers each get their own
+    partition, so it starts at one row). Free slots expire at -inf.
+    """
+    def __init__(self, dim: int, capacity: int = 1) -> None:
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.expires = np.full(capacity, -np.inf)
+        self.keys = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.keys) - len(self.free)
+
+    def add(self, key, vector, expires: float) -> int:
+        if not self.free:
+            capacity = len(self.keys)
+            self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+            self.expires = np.concatenate([self.expires, np.full(capacity, -np.inf)])
+            self.keys.extend([None] * capacity)
+            self.free = list(range(2 * capacity - 1, capacity - 1, -1))
+        slot = self.free.pop()
+        self.vectors[slot] = vector
+        self.expires[slot] = expires
+        self.keys[slot] = key
+        return slot
+
+    def remove(self, slot: int) -> None:
+        self.expires[slot] = -np.inf
+        self.keys[slot] = None
+        self.free.append(slot)
+
+    def best(self, query, now: float):
+        """
+        Return (key, score) of the most similar live entry, or None.
+        """
+        if len(self) == 0:
+            return None
+        scores = self.vectors @ query
+        scores[self.expires < now] = -np.inf
+        slot = int(np.argmax(scores))
+        if scores[slot] == -np.inf:
+            return None
+        return self.keys[slot], float(scores[slot])
+
+
+class ResponseCache:
+    """
+    Two-tier cache of generated answers. The exact tier is keyed by (namespace, model, temperature,
+    normalized prompt); on a miss, the semantic tier returns the answer of the most similar cached
+    prompt in the same (namespace, model, temperature) when its cosine similarity reaches the threshold
+    and both prompts contain the same numbers (blood pressure 150/110 and 110/70 embed alike).
+    Entries carry their own TTL and the least recently used ones are evicted beyond max_size.
+    """
+    def __init__(self, max_size: int = 2000, ttl: float = 3600, similarity_threshold: float = 0.95) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.entries = OrderedDict()  # key -> (value, expires, partition key or None, slot)
+        self.partitions = {}          # (namespace, model, temperature, numbers) -> _Partition
+        self.lock = Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(namespace: str, model: str, temperature: float, prompt: str):
+        return (namespace, model, float(temperature), normalize_query(prompt))
+
+    def _delete(self, key):
+        _, _, partition_key, slot = self.entries.pop(key)
+        if partition_key is not None:
+            partition = self.partitions[partition_key]
+            partition.remove(slot)
+            if len(partition) == 0:
+                del self.partitions[partition_key]
+
+    def get(self, namespace: str, model: str, temperature: float, prompt: str):
+        """
+        Exact tier only; a miss is not counted, so the semantic lookup can follow.
+        """
+        key = self._key(namespace, model, temperature, prompt)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                self._delete(key)
+                return None
+            self.entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry[0]
+
+    def get_similar(self, namespace: str, model: str, temperature: float, prompt: str, embedding):
+        """
+        Semantic tier, scanned after an exact miss. Pass embedding=None when no embedding is available.
+        """
+        if embedding is None or self.similarity_threshold > 1:
+            with self.lock:
+                self.misses += 1
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        key = self._key(namespace, model, temperature, prompt)
+        partition_key = key[:3] + (prompt_numbers(key[3]),)
+        now = time.monotonic()
+        with self.lock:
+            partition = self.partitions.get(partition_key)
+            best = partition.best(query, now) if partition is not None else None
+            if best is not None and best[1] >= self.similarity_threshold:
+                self.entries.move_to_end(best[0])
+                self.semantic_hits += 1
+                return self.entries[best[0]][0]
+            self.misses += 1
+            return None
+
+    def put(self, namespace: str, model: str, temperature: float, prompt: str, value, embedding=None, ttl: float = None) -> None:
+        key = self._key(namespace, model, temperature, prompt)
+        vector = None
+        if embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            if key in self.entries:
+                self._delete(key)
+            partition_key, slot = None, None
+            if vector is not None:
+                partition_key = key[:3] + (prompt_numbers(key[3]),)
+                partition = self.partitions.get(partition_key)
+                if partition is None:
+                    partition = self.partitions[partition_key] = _Partition(len(vector))
+                slot = partition.add(key, vector, expires)
+            self.entries[key] = (value, expires, partition_key, slot)
+            while len(self.entries) > self.max_size:
+                self._delete(next(iter(self.entries)))
+
+    def stats(self):
+        with self.lock:
+            hits = self.exact_hits + self.semantic_hits
+            total = hits + self.misses
+            return {
+                "size": len(self.entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+            }
@@ -0,0 +1,290 @@
+import os
+import time
+import uuid
+import fcntl
+import sqlite3
+import schedule
+from threading import Thread, Lock, Event
+from utils import get_logging
+logger = get_logging(__file__)
+
+
+class VectorJobCancelled(Exception):
+    pass
+
+
+class VectorJobConflict(Exception):
+    pass
+
+
+_JOB_COLUMNS = ("job_id", "kind", "status", "created_at", "started_at", "finished_at", "rows_total", "rows_embedded", "error")
+
+
+class VectorJobStore:
+    """
+    Job status and cancel requests on the SQLite file shared by all workers (the vector sync
+    state file), so any worker can report or cancel a job running in another one.
+    """
+    def __init__(self, path: str = None, max_history: int = 50) -> None:
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self.max_history = max_history
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path or ":memory:", check_same_thread=False, timeout=30)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS vector_jobs ("
+                "job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL, "
+                "started_at REAL, finished_at REAL, rows_total INTEGER NOT NULL, rows_embedded INTEGER NOT NULL, "
+                "error TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0)"
+            )
+
+    def save(self, job) -> None:
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO vector_jobs (job_id, kind, status, created_at, started_at, finished_at, rows_total, rows_embedded, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (job_id) DO UPDATE SET status = excluded.status, "
+                "started_at = excluded.started_at, finished_at = excluded.finished_at, rows_total = excluded.rows_total, "
+                "rows_embedded = excluded.rows_embedded, error = excluded.error",
+                (job.id, job.kind, job.status, job.created_at, job.started_at, job.finished_at, job.rows_total, job.rows_embedded, job.error)
+            )
+            self.conn.execute(
+                "DELETE FROM vector_jobs WHERE job_id NOT IN (SELECT job_id FROM vector_jobs ORDER BY created_at DESC LIMIT ?)",
+                (self.max_history,)
+            )
+
+    def get(self, job_id: str):
+        with self.lock:
+            row = self.conn.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM vector_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return job_dict(row) if row else None
+
+    def list(self):
+        with self.lock:
+            rows = self.conn.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM vector_jobs ORDER BY created_at DESC").fetchall()
+        return [job_dict(row) for row in rows]
+
+    def request_cancel(self, job_id: str):
+        """
+        Flag a pending or running job for cancellation; the worker running it polls the flag.
+        """
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE vector_jobs SET cancel_requested = 1 WHERE job_id = ? AND status IN ('pending', 'running')", (job_id,))
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self.lock:
+            row = self.conn.execute("SELECT cancel_requested FROM vector_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def interrupt_unfinished(self) -> None:
+        """
+        Mark jobs left pending or running by a worker that died; called while holding the job locks.
+        """
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE vector_jobs SET status = 'failed', error = 'interrupted', finished_at = ? "
+                              "WHERE status IN ('pending', 'running')", (time.time(),))
+
+
+def job_dict(row):
+    job = dict(zip(_JOB_COLUMNS, row))
+    end = job["finished_at"] or time.time()
+    elapsed = end - job["started_at"] if job["started_at"] else 0.0
+    job["rows_per_sec"] = job["rows_embedded"] / elapsed if elapsed else 0.0
+    return job
+
+
+class VectorJob:
+    """
+    State and progress of one vector build or sync running in the background. Progress is
+    written to the store at most once per second, and cancel requests are read from it.
+    """
+    def __init__(self, kind: str, store: VectorJobStore) -> None:
+        self.id = uuid.uuid4().hex
+        self.store = store
+        self.kind = kind
+        self.status = "pending"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.rows_total = 0
+        self.rows_embedded = 0
+        self.error = None
+        self.cancel_event = Event()
+        self.saved_at = 0.0
+        self.cancel_checked_at = 0.0
+
+    def save(self, force: bool = True):
+        now = time.monotonic()
+        if force or now - self.saved_at >= 1:
+            self.saved_at = now
+            self.store.save(self)
+
+    def add_total(self, n: int):
+        self.rows_total += n
+        self.save(force=False)
+
+    def advance(self, n: int):
+        self.rows_embedded += n
+        self.save(force=False)
+
+    def check_cancelled(self):
+        now = time.monotonic()
+        if not self.cancel_event.is_set() and now - self.cancel_checked_at >= 1:
+            self.cancel_checked_at = now
+            if self.store.cancel_requested(self.id):
+                self.cancel_event.set()
+        if self.cancel_event.is_set():
+            raise VectorJobCancelled(f"Job {self.id} cancelled")
+
+    def to_dict(self):
+        return job_dict(tuple(getattr(self, "id" if column == "job_id" else column) for column in _JOB_COLUMNS))
+
+
+class VectorJobRunner:
+    """
+    Runs ContentQuery vector builds and syncs as background jobs, one at a time,
+    and optionally on an in-process daily schedule.
+    With several workers, the file lock at lock_path keeps jobs from overlapping across
+    processes (a scheduled job fires in every worker, the first one wins), and job status
+    lives in the VectorJobStore at state_path, so every worker can read and cancel any job.
+    """
+    def __init__(self, get_content, max_history: int = 50, lock_path: str = None, retry_seconds: float = 5, state_path: str = None) -> None:
+        self.get_content = get_content  # ContentQuery is built on first job, see services.py
+        self.lock_path = lock_path
+        self.retry_seconds = retry_seconds
+        self.pending_lock = Lock()
+        self.sync_pending = False
+        self.store = VectorJobStore(state_path, max_history)
+        self.run_lock = Lock()  # held while a job runs, so jobs never overlap
+        self.scheduler = schedule.Scheduler()
+        self.scheduler_thread = None
+
+    def _acquire_file_lock(self):
+        """
+        Return the open, locked lock file, True when no lock file is configured,
+        or None when another process holds the lock.
+        """
+        if not self.lock_path:
+            return True
+        directory = os.path.dirname(self.lock_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def submit(self, kind: str = "build") -> VectorJob:
+        if not self.run_lock.acquire(blocking=False):
+            raise VectorJobConflict("A vector job is already running")
+        lock_file = self._acquire_file_lock()
+        if lock_file is None:
+            self.run_lock.release()
+            raise VectorJobConflict("A vector job is already running in another worker")
+        try:
+            # no job runs anywhere while both locks are held
+            self.store.interrupt_unfinished()
+            job = VectorJob(kind, self.store)
+            job.save()
+        except Exception:
+            if hasattr(lock_file, "close"):
+                lock_file.close()
+            self.run_lock.release()
+            raise
+        Thread(target=self._run, args=(job, lock_file), daemon=True).start()
+        return job
+
+    def _run(self, job: VectorJob, lock_file=None):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.save()
+            content = self.get_content()
+            if job.kind == "sync":
+                content.call_sync_vector(job=job)
+            else:
+                content.call_build_vector(job=job)
+            job.status = "succeeded"
+        except VectorJobCancelled:
+            job.status = "cancelled"
+            logger.info(f"Vector job {job.id} cancelled.")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"Vector job {job.id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            try:
+                job.save()
+            except Exception as e:
+                logger.error(f"Could not record the end of vector job {job.id}: {e}")
+            if hasattr(lock_file, "close"):
+                lock_file.close()  # releases the flock
+            self.run_lock.release()
+
+    def get(self, job_id: str):
+        return self.store.get(job_id)
+
+    def list(self):
+        return self.store.list()
+
+    def cancel(self, job_id: str):
+        return self.store.request_cancel(job_id)
+
+    def request_sync(self):
+        """
+        Sync after a data change. While a job runs (here or in another worker) the requests are
+        coalesced into one pending sync, retried until it can start. Returns the job when it started now.
+        """
+        with self.pending_lock:
+            if self.sync_pending:
+                return None
+            try:
+                return self.submit("sync")
+            except VectorJobConflict:
+                self.sync_pending = True
+        Thread(target=self._retry_pending_sync, daemon=True).start()
+        return None
+
+    def _retry_pending_sync(self):
+        while True:
+            time.sleep(self.retry_seconds)
+            with self.pending_lock:
+                try:
+                    job = self.submit("sync")
+                except VectorJobConflict:
+                    continue
+                self.sync_pending = False
+            logger.info(f"Pending vector sync started as job {job.id}.")
+            return
+
+    def _submit_scheduled(self, kind: str):
+        try:
+            job = self.submit(kind)
+            logger.info(f"Scheduled vector {kind} started as job {job.id}.")
+        except VectorJobConflict:
+            logger.info(f"Scheduled vector {kind} skipped, another job is running.")
+
+    def start_schedule(self, rebuild_at: str = None, sync_every_minutes: int = 0):
+        """
+        Schedule a daily full rebuild at rebuild_at ("HH:MM") and/or an incremental sync
+        every sync_every_minutes minutes.
+        """
+        if rebuild_at:
+            self.scheduler.every().day.at(rebuild_at).do(self._submit_scheduled, "build")
+        if sync_every_minutes:
+            self.scheduler.every(sync_every_minutes).minutes.do(self._submit_scheduled, "sync")
+        if not self.scheduler.jobs or self.scheduler_thread:
+            return
+        self.scheduler_thread = Thread(target=self._run_schedule, daemon=True)
+        self.scheduler_thread.start()
+
+    def _run_schedule(self):
+        while True:
+            self.scheduler.run_pending()
+            time.sleep(1)
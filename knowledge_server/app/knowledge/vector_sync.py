@@ -0,0 +1,82 @@
+import os
+import json
+import sqlite3
+import uuid
+from threading import Lock
+from app.knowledge.embedding_cache import content_hash
+
+
+def document_id(table_name: str, row_id: int) -> str:
+    """
+    Stable vector id for a database row (Qdrant only accepts UUIDs or integers as point ids).
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{table_name}/{row_id}"))
+
+
+def document_hash(text: str, metadata: dict) -> str:
+    return content_hash(text + json.dumps(metadata, sort_keys=True, ensure_ascii=False))
+
+
+class VectorSyncState:
+    """
+    Per vector store record of which rows are indexed and the content hash they were indexed with.
+    Stored on a local SQLite file next to the embedding cache. The generation counter goes up
+    with every recorded change, so all workers can tell when the indexed data changed.
+    """
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS vector_rows ("
+                "store TEXT NOT NULL, row_id INTEGER NOT NULL, hash TEXT NOT NULL, "
+                "PRIMARY KEY (store, row_id))"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS sync_generation (id INTEGER PRIMARY KEY CHECK (id = 0), generation INTEGER NOT NULL)")
+            self.conn.execute("INSERT OR IGNORE INTO sync_generation (id, generation) VALUES (0, 0)")
+
+    def generation(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT generation FROM sync_generation WHERE id = 0").fetchone()[0]
+
+    def bump_generation(self) -> None:
+        """
+        Record a change of the indexed data that is not kept in vector_rows, e.g. keyword-only fields.
+        """
+        with self.lock, self.conn:
+            self._bump_generation()
+
+    def _bump_generation(self):
+        self.conn.execute("UPDATE sync_generation SET generation = generation + 1 WHERE id = 0")
+
+    def get(self, store: str) -> dict:
+        """
+        Return {row_id: hash} for the rows indexed in the store.
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT row_id, hash FROM vector_rows WHERE store = ?", (store,)).fetchall()
+        return dict(rows)
+
+    def replace(self, store: str, hashes: dict) -> None:
+        """
+        Record a full rebuild of the store.
+        """
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM vector_rows WHERE store = ?", (store,))
+            self.conn.executemany("INSERT INTO vector_rows (store, row_id, hash) VALUES (?, ?, ?)",
+                                  [(store, row_id, h) for row_id, h in hashes.items()])
+            self._bump_generation()
+
+    def apply(self, store: str, upserted: dict, deleted: list) -> None:
+        """
+        Record an incremental sync of the store.
+        """
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM vector_rows WHERE store = ? AND row_id = ?",
+                                  [(store, row_id) for row_id in deleted])
+            self.conn.executemany("INSERT OR REPLACE INTO vector_rows (store, row_id, hash) VALUES (?, ?, ?)",
+                                  [(store, row_id, h) for row_id, h in upserted.items()])
+            self._bump_generation()
@@ -26,9 +26,19 @@ class MedicalQuery:
     def search_diagnosis_rag(self, query:str, embed_results:list, rerank_results:list):
         """
         Using embedding and reranker model to search the diagnosis standards based on the query.
+        rerank_results are (index into embed_results, rerank score) pairs in rerank order.
         """
         print(f"query: {query}")
-        response = [item for item in embed_results if item.text in rerank_results]
+        response = []
+        for index, rerank_score in rerank_results:
+            item = embed_results[index]
+            response.append({
+                "id": item.node.node_id,
+                "text": item.node.get_content(),
+                "metadata": item.node.metadata,
+                "embed_score": item.score,
+                "rerank_score": rerank_score,
+            })
         logger.info(f"RAG结果: {response}")
         if response is None:
             raise ValueError("Medical RAG search_diagnosis is None")
@@ -0,0 +1,274 @@
+"""
+Stage-level benchmark of the diagnosis standards retrieval path.
+
+Runs the /medical/diagnosis_standards_rag pipeline (query embedding, Qdrant search, rerank,
+MedicalQuery join) against local stand-ins: the embedding and rerank stub of
+benchmarks/openai_stub.py and Qdrant in-memory mode, over synthetic diagnosis_standards corpora.
+The in-process local vector index and keyword index are measured alongside. Reports the latency
+distribution and throughput of every stage per corpus size.
+
+Run from the knowledge_server directory:
+    python benchmarks/bench_retrieval.py --sizes 1000,10000,100000 --queries 200 --concurrency 16
+Save a baseline with --output and compare later runs with --baseline; a p95 more than
+--tolerance slower than the baseline is reported as a regression and the exit code is 1.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import statistics
+from threading import Lock
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+import httpx
+from qdrant_client import AsyncQdrantClient
+from llama_index.core import Document, VectorStoreIndex
+from llama_index.embeddings.openai import OpenAIEmbedding
+from llama_index.vector_stores.qdrant import QdrantVectorStore
+from configs import DIAGNOSIS_STANDARD_TABLE_NAME
+from app.knowledge.knowledge import ContentQuery
+from app.knowledge.query_cache import QueryEmbeddingCache
+from app.knowledge.rerank_client import RerankClient
+from app.knowledge.local_vector_index import LocalVectorIndex
+from app.knowledge.keyword_index import KeywordIndex
+from app.knowledge.vector_sync import VectorSyncState, document_id, document_hash
+from app.medical.diagnosis_standards import MedicalQuery
+from benchmarks.openai_stub import stub_embedding
+
+EMBED_MODEL = "text-embedding-3-small"  # any name OpenAIEmbedding accepts, the stub ignores it
+
+ORGANS = ["心脏", "肺部", "肝脏", "肾脏", "胃部", "肠道", "皮肤", "关节", "甲状腺", "血管", "大脑", "眼部"]
+SIGNS = ["疼痛", "发热", "咳嗽", "乏力", "头晕", "恶心", "水肿", "出血", "麻木", "心悸", "气短", "皮疹"]
+COURSES = ["急性", "慢性", "反复发作", "进行性加重", "间歇性", "突发"]
+
+
+def synthetic_corpus(size: int, seed: int = 0):
+    """
+    Rows shaped like crud.get_diagnosis_standards_for_keyword_index:
+    (row_id, name, describes, symptom, type_ab, is_emergency, urgency_level).
+    """
+    rng = random.Random(seed)
+    rows = []
+    for row_id in range(1, size + 1):
+        organ, course = rng.choice(ORGANS), rng.choice(COURSES)
+        signs = rng.sample(SIGNS, 3)
+        name = f"{organ}{course}病变{row_id}"
+        describes = f"{course}{organ}疾病，编号{row_id}，常见表现为{'、'.join(signs)}，需结合检查明确诊断。"
+        symptom = f"{signs[0]}{rng.randint(1, 30)}天，伴{signs[1]}和{signs[2]}"
+        rows.append((row_id, name, describes, symptom, rng.choice(["A", "B"]), rng.randint(0, 1), rng.randint(1, 5)))
+    return rows
+
+
+def corpus_documents(rows: list, dim: int):
+    # same shape as ContentQuery.load_documents, embedded with the stub's vectors
+    documents = []
+    for (row_id, name, describes, symptom, type_ab, is_emergency, urgency_level) in rows:
+        document = Document(
+            id_=document_id(DIAGNOSIS_STANDARD_TABLE_NAME, row_id), text=describes,
+            metadata={"disease_name": name, "type_ab": type_ab, "is_emergency": is_emergency, "urgency_level": urgency_level},
+            excluded_embed_metadata_keys=['disease_name', 'type_ab', 'is_emergency', 'urgency_level'])
+        document.embedding = stub_embedding(describes, dim).tolist()
+        documents.append(document)
+    return documents
+
+
+async def build_content(rows: list, api_base: str, dim: int, index_dir: str):
+    """
+    ContentQuery wired to the stub and in-memory backends. __init__ is skipped because it
+    connects to the configured Postgres, Qdrant and rerank hosts.
+    """
+    content = ContentQuery.__new__(ContentQuery)
+    content.embed_model = OpenAIEmbedding(model_name=EMBED_MODEL, api_base=api_base, api_key='EMPTY')
+    content.query_embedding_cache = QueryEmbeddingCache(max_size=len(rows) + 1000, ttl=3600)
+    content.rerank_client = RerankClient(api_base, "stub-reranker", pool_size=64)
+    content.qdrant_vector_store = QdrantVectorStore(
+        aclient=AsyncQdrantClient(location=":memory:"),
+        collection_name=DIAGNOSIS_STANDARD_TABLE_NAME
+    )
+    documents = corpus_documents(rows, dim)
+    await content.qdrant_vector_store.async_add(documents)
+    content.qdrant_vector_index = VectorStoreIndex.from_vector_store(embed_model=content.embed_model, vector_store=content.qdrant_vector_store)
+    content.local_vector_index = LocalVectorIndex(index_dir)
+    content.local_vector_index.build(documents)
+    content.keyword_index = KeywordIndex()
+    # filled below instead of from the database; a fresh sync state keeps it from reloading
+    content.sync_state = VectorSyncState(os.path.join(index_dir, "vector_sync.db"))
+    content.keyword_sync_lock = Lock()
+    content.keyword_generation = content.sync_state.generation()
+    content.keyword_checked_at = 0.0
+    content.keyword_reloading = False
+    for (row_id, name, describes, symptom, type_ab, is_emergency, urgency_level) in rows:
+        text = f"{describes}\n{symptom}"
+        metadata = {"disease_name": name, "type_ab": type_ab, "is_emergency": is_emergency, "urgency_level": urgency_level}
+        node = {"id": document_id(DIAGNOSIS_STANDARD_TABLE_NAME, row_id), "text": describes, "metadata": metadata}
+        content.keyword_index.add(row_id, document_hash(text + name, metadata), text, node)
+    return content
+
+
+class StageTimer:
+    def __init__(self) -> None:
+        self.samples = {}
+        self.walls = {}
+
+    def add(self, stage: str, seconds: float):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def report(self):
+        report = {}
+        for stage, values in self.samples.items():
+            values = sorted(values)
+            wall = self.walls.get(stage)
+            report[stage] = {
+                "n": len(values),
+                "p50_ms": values[len(values) // 2] * 1000,
+                "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))] * 1000,
+                "p99_ms": values[min(len(values) - 1, int(len(values) * 0.99))] * 1000,
+                "mean_ms": statistics.fmean(values) * 1000,
+                "throughput_per_s": len(values) / wall if wall else None,
+            }
+        return report
+
+
+async def run_concurrently(items: list, concurrency: int, fn):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item):
+        async with semaphore:
+            return await fn(item)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(item) for item in items))
+    return time.perf_counter() - started
+
+
+async def bench_size(rows: list, args, timer: StageTimer):
+    with tempfile.TemporaryDirectory() as index_dir:
+        started = time.perf_counter()
+        content = await build_content(rows, args.api_base, args.dim, index_dir)
+        timer.add("index_build", time.perf_counter() - started)
+        medical = MedicalQuery()
+        queries = [row[2] for row in random.Random(1).sample(rows, min(args.queries, len(rows)))]
+
+        async def rag(query):
+            # the /medical/diagnosis_standards_rag path, one stage at a time
+            t0 = time.perf_counter()
+            await content.aquery_bundle(query)
+            t1 = time.perf_counter()
+            embed_results = await content.aqdrant_embed_search(query, top_k=args.top_k)
+            t2 = time.perf_counter()
+            rerank_results = await content.areranker_scores(query, [item.text for item in embed_results], top_k=args.rerank_top_k)
+            t3 = time.perf_counter()
+            medical.search_diagnosis_rag(query, embed_results, rerank_results)
+            t4 = time.perf_counter()
+            for stage, seconds in (("embed", t1 - t0), ("qdrant_search", t2 - t1), ("rerank", t3 - t2), ("rag_join", t4 - t3), ("rag_total", t4 - t0)):
+                timer.add(stage, seconds)
+
+        wall = await run_concurrently(queries, args.concurrency, rag)
+        for stage in ("embed", "qdrant_search", "rerank", "rag_join", "rag_total"):
+            timer.walls[stage] = wall
+
+        # the embeddings are cached now, so these only time the search itself
+        async def local(query):
+            started = time.perf_counter()
+            await content.alocal_embed_search(query, top_k=args.top_k)
+            timer.add("local_search", time.perf_counter() - started)
+
+        async def keyword(query):
+            started = time.perf_counter()
+            content.keyword_search(query, top_k=args.top_k)
+            timer.add("keyword_search", time.perf_counter() - started)
+
+        timer.walls["local_search"] = await run_concurrently(queries, args.concurrency, local)
+        timer.walls["keyword_search"] = await run_concurrently(queries, args.concurrency, keyword)
+
+        batches = [queries[i:i + args.batch_size] for i in range(0, len(queries), args.batch_size)]
+
+        async def qdrant_batch(batch):
+            started = time.perf_counter()
+            await content.aqdrant_embed_search_batch(batch, top_k=args.top_k)
+            timer.add("qdrant_search_batch", time.perf_counter() - started)
+
+        wall = await run_concurrently(batches, args.concurrency, qdrant_batch)
+        timer.walls["qdrant_search_batch"] = wall / len(queries) * len(batches)  # throughput counted in queries
+        await content.rerank_client.aclose()
+
+
+def start_stub(args):
+    stub = subprocess.Popen([sys.executable, "benchmarks/openai_stub.py", "--port", str(args.port), "--dim", str(args.dim),
+                             "--embed-delay", str(args.embed_delay), "--rerank-delay", str(args.rerank_delay)])
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.post(f"{args.api_base}/embeddings", json={"input": ["ping"]}, timeout=1)
+            return stub
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    stub.terminate()
+    raise RuntimeError("openai_stub did not start")
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    regressions = []
+    for size, stages in results.items():
+        for stage, current in stages.items():
+            previous = baseline.get(size, {}).get(stage)
+            if previous and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{size:>7} {stage:<20} p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated corpus sizes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=32, help="queries per Qdrant batch search")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--rerank-top-k", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--embed-delay", type=float, default=0.0, help="simulated embedding latency, seconds")
+    parser.add_argument("--rerank-delay", type=float, default=0.0, help="simulated rerank latency, seconds")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown against the baseline")
+    args = parser.parse_args()
+    args.api_base = f"http://127.0.0.1:{args.port}/v1"
+
+    stub = start_stub(args)
+    results = {}
+    try:
+        for size in [int(size) for size in args.sizes.split(",")]:
+            timer = StageTimer()
+            asyncio.run(bench_size(synthetic_corpus(size), args, timer))
+            results[str(size)] = timer.report()
+    finally:
+        stub.terminate()
+
+    print(f"{'rows':>7} {'stage':<20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per s':>9}")
+    for size, stages in results.items():
+        for stage, r in stages.items():
+            throughput = f"{r['throughput_per_s']:9.1f}" if r["throughput_per_s"] else f"{'':>9}"
+            print(f"{size:>7} {stage:<20} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f} {throughput}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Startup-time benchmark for the knowledge server.
+
+Measures, in fresh interpreters, how long `import main` and the FastAPI lifespan take,
+then how long each lazily built service takes on first use.
+
+Run from the knowledge_server directory:
+    python benchmarks/bench_startup.py --repeat 5
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter() - started
+from fastapi.testclient import TestClient
+started = time.perf_counter()
+with TestClient(main.app):
+    booted = time.perf_counter() - started
+import services
+builds = {}
+for service in services.all_services:
+    try:
+        service.get()
+    except Exception:
+        pass
+    builds[service.name] = service.status()
+print(json.dumps({"import": imported, "lifespan": booted, "services": builds}))
+"""
+
+
+def run_once():
+    env = dict(os.environ, EAGER_SERVICES="false")
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=SERVER_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.repeat)]
+    for stage in ("import", "lifespan"):
+        values = [run[stage] for run in runs]
+        print(f"{stage:<12} median {statistics.median(values) * 1000:8.1f} ms   max {max(values) * 1000:8.1f} ms")
+    for name, status in runs[-1]["services"].items():
+        if status["status"] == "ready":
+            values = [run["services"][name]["build_seconds"] for run in runs]
+            print(f"{name:<12} median {statistics.median(values) * 1000:8.1f} ms   (first use)")
+        else:
+            print(f"{name:<12} {status['status']}: {status['error']}")
+
+
+if __name__ == "__main__":
+    main()
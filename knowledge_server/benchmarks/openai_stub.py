@@ -0,0 +1,105 @@
+"""
+Local OpenAI-compatible stub of the LLM, embedding and rerank backends, for evaluation,
+benchmarks and load tests without a GPU.
+
+Answers /v1/chat/completions after a configurable delay. Questions found in --dataset get their
+expected response, anything else gets --default-answer.
+/v1/embeddings returns deterministic unit vectors seeded by the text, and /v1/rerank scores
+documents by the cosine similarity of those vectors, so repeated runs rank the same way.
+
+Run from the knowledge_server directory:
+    python benchmarks/openai_stub.py --port 9000 --delay 0.2
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import hashlib
+import argparse
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+from app.chat.evaluation import load_dataset
+
+
+def stub_embedding(text: str, dim: int = 1024):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def create_app(answers: dict, default_answer: str = "是。", delay: float = 0.0, dim: int = 1024,
+               embed_delay: float = 0.0, rerank_delay: float = 0.0):
+    app = FastAPI()
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        data = await request.json()
+        texts = data["input"] if isinstance(data["input"], list) else [data["input"]]
+        await asyncio.sleep(embed_delay)
+        return {
+            "object": "list",
+            "model": data.get("model", "stub"),
+            "data": [{"object": "embedding", "index": i, "embedding": stub_embedding(text, dim).tolist()} for i, text in enumerate(texts)],
+            "usage": {"prompt_tokens": sum(len(text) for text in texts), "total_tokens": sum(len(text) for text in texts)},
+        }
+
+    @app.post("/v1/rerank")
+    async def rerank(request: Request):
+        data = await request.json()
+        query = stub_embedding(data["query"], dim)
+        scores = [float(query @ stub_embedding(document, dim) + 1) / 2 for document in data["documents"]]
+        order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:data.get("top_n") or len(scores)]
+        await asyncio.sleep(rerank_delay)
+        return {
+            "model": data.get("model", "stub"),
+            "results": [{"index": i, "relevance_score": scores[i], "document": {"text": data["documents"][i]}} for i in order],
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        data = await request.json()
+        question = data["messages"][-1]["content"]
+        answer = answers.get(question, default_answer)
+        await asyncio.sleep(delay)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": data.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": sum(len(message["content"]) for message in data["messages"]),
+                "completion_tokens": len(answer),
+                "total_tokens": sum(len(message["content"]) for message in data["messages"]) + len(answer),
+            },
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before each answer")
+    parser.add_argument("--embed-delay", type=float, default=0.0, help="seconds before each embedding response")
+    parser.add_argument("--rerank-delay", type=float, default=0.0, help="seconds before each rerank response")
+    parser.add_argument("--dim", type=int, default=1024, help="embedding dimension")
+    parser.add_argument("--dataset", default=os.path.join(SERVER_DIR, "app/chat/datasets/health_yes_no.jsonl"))
+    parser.add_argument("--default-answer", default="是。")
+    args = parser.parse_args()
+
+    answers = {}
+    if args.dataset:
+        answers = {row["inputs"]["question"]: row["expectations"]["expected_response"] for row in load_dataset(args.dataset)}
+    app = create_app(answers, args.default_answer, args.delay, args.dim, args.embed_delay, args.rerank_delay)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,37 @@ from dotenv import load_dotenv
 load_dotenv()
 
 LOCAL_SERVER_PORT = 8000
+EAGER_SERVICES = os.getenv('EAGER_SERVICES', 'true').lower() == 'true'  # build services in the background right after startup
+
+##### serving config #####
+SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.getenv('SERVER_PORT', 8001))
+WORKERS     = int(os.getenv('WORKERS', 1))  # uvicorn worker processes
+
+## connection budgets for the whole server, split evenly between the workers
+DB_MAX_CONNECTIONS   = int(os.getenv('DB_MAX_CONNECTIONS', 40))    # mysql
+PG_MAX_CONNECTIONS   = int(os.getenv('PG_MAX_CONNECTIONS', 40))    # postgres (pgvector)
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 80))  # per http backend (rerank)
+
+def _worker_share(total):
+    share = max(2, total // WORKERS)
+    return share // 2, share - share // 2  # pool size, max overflow
+
+DB_POOL_SIZE, DB_MAX_OVERFLOW = _worker_share(DB_MAX_CONNECTIONS)
+PG_POOL_SIZE, PG_MAX_OVERFLOW = _worker_share(PG_MAX_CONNECTIONS)
 
 ##### model config #####
 ## Set models
 MODEL_NAME = 'qwen3'
 LLM_API_BASE = "http://192.168.100.30:8001/v1"
 
+## admission control in front of the LLM backend
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 32))    # requests in flight for the whole server, split between the workers
+LLM_MAX_QUEUE       = int(os.getenv('LLM_MAX_QUEUE', 64))          # waiting requests per worker before shedding
+LLM_QUEUE_TIMEOUT   = float(os.getenv('LLM_QUEUE_TIMEOUT', 30))    # longest queue wait, seconds
+LLM_RETRY_AFTER     = int(os.getenv('LLM_RETRY_AFTER', 5))         # Retry-After hint of shed requests, seconds
+CHAT_PRIORITY       = int(os.getenv('CHAT_PRIORITY', 10))          # lower is served first
+
 T = 0
 MAX_TOKENS = 2048
 TIME_OUT = 600
@@ -17,15 +42,48 @@ TIME_OUT = 600
 EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME')
 EMBED_API_BASE       = os.getenv('EMBED_API_BASE')
 EMBEDDING_TOP_K      = os.getenv('EMBEDDING_TOP_K')
+EMBED_BATCH_SIZE     = int(os.getenv('EMBED_BATCH_SIZE', 64))       # texts per embedding request
+EMBED_MAX_CONCURRENCY = int(os.getenv('EMBED_MAX_CONCURRENCY', 4))  # embedding requests in flight
+EMBED_MAX_RETRIES    = int(os.getenv('EMBED_MAX_RETRIES', 3))       # retries per failed batch
+EMBED_CACHE_PATH     = os.getenv('EMBED_CACHE_PATH', "cache/embeddings.sqlite3")  # shared by all vector store builds
+QUERY_EMBED_CACHE_SIZE = int(os.getenv('QUERY_EMBED_CACHE_SIZE', 10000))  # query embeddings kept in memory
+QUERY_EMBED_CACHE_TTL  = int(os.getenv('QUERY_EMBED_CACHE_TTL', 3600))    # seconds
         
 
 ## set rerank model and api
 RERANK_MODEL_NAME = os.getenv('RERANK_MODEL_NAME')
 RERANK_API_BASE   = os.getenv('RERANK_API_BASE')
 RERANK_TOP_K      = os.getenv('RERANK_TOP_K')
+RERANK_POOL_SIZE       = int(os.getenv('RERANK_POOL_SIZE', max(4, HTTP_MAX_CONNECTIONS // WORKERS)))  # keep-alive connections per worker
+RERANK_CONNECT_TIMEOUT = float(os.getenv('RERANK_CONNECT_TIMEOUT', 3))  # seconds
+RERANK_READ_TIMEOUT    = float(os.getenv('RERANK_READ_TIMEOUT', 30))    # seconds
+RERANK_MAX_CONCURRENCY = int(os.getenv('RERANK_MAX_CONCURRENCY', 16))   # concurrent requests of a batch rerank
 
 FAISS_SCORE = 0.75
 
+## fused retrieval
+RRF_K = int(os.getenv('RRF_K', 60))                                  # reciprocal rank fusion constant
+FUSED_SEARCH_TIMEOUT = float(os.getenv('FUSED_SEARCH_TIMEOUT', 2))   # shared deadline of all backends, seconds
+
+## response cache for chat and medical RAG answers
+RESPONSE_CACHE_ENABLED    = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+RESPONSE_CACHE_SIZE       = int(os.getenv('RESPONSE_CACHE_SIZE', 2000))            # answers kept per worker
+RESPONSE_CACHE_SIMILARITY = float(os.getenv('RESPONSE_CACHE_SIMILARITY', 0.95))    # cosine similarity for a semantic hit, above 1 disables the tier
+CHAT_CACHE_TTL            = int(os.getenv('CHAT_CACHE_TTL', 3600))                 # seconds
+RAG_CACHE_TTL             = int(os.getenv('RAG_CACHE_TTL', 600))                   # seconds, also cleared when the standards change
+
+## tracing
+MLFLOW_TRACKING_URI  = os.getenv('MLFLOW_TRACKING_URI', "http://127.0.0.1:5000")
+MLFLOW_EXPERIMENT_ID = os.getenv('MLFLOW_EXPERIMENT_ID', "0")
+TRACE_SAMPLE_RATES   = os.getenv('TRACE_SAMPLE_RATES', "chat=1.0")   # endpoint=rate pairs, unlisted endpoints are not traced
+TRACE_BUFFER_SIZE    = int(os.getenv('TRACE_BUFFER_SIZE', 1000))      # records waiting for export, newer ones are dropped when full
+TRACE_BATCH_SIZE     = int(os.getenv('TRACE_BATCH_SIZE', 50))
+TRACE_FLUSH_SECONDS  = float(os.getenv('TRACE_FLUSH_SECONDS', 5))     # longest wait before a partial batch is exported
+
+## evaluation
+EVAL_DATASET_PATH    = os.getenv('EVAL_DATASET_PATH', "app/chat/datasets/health_yes_no.jsonl")
+EVAL_MAX_CONCURRENCY = int(os.getenv('EVAL_MAX_CONCURRENCY', 8))     # predictions in flight
+
 ##### database config #####
 ### neo4j config ###
 NEO4J_API = os.getenv('NEO4J_API')
@@ -48,9 +106,19 @@ POSTGRES_SCHEMA  = os.getenv('LOCAL_POSTGRES_SCHEMA')
 ### qdrant config ###
 QDRANT_HOST = os.getenv('QDRANT_HOST')
 
+### local vector index config ###
+LOCAL_VECTOR_INDEX_PATH = os.getenv('LOCAL_VECTOR_INDEX_PATH', "cache/local_vector_index")
+LOCAL_VECTOR_HNSW_THRESHOLD = int(os.getenv('LOCAL_VECTOR_HNSW_THRESHOLD', 50000))  # rows above which an HNSW graph is built (needs hnswlib)
+
 ### knowledge table names config ###
 DIAGNOSIS_STANDARD_TABLE_NAME = "diagnosis_standards"
 
+### vector sync config ###
+VECTOR_SYNC_STATE_PATH = os.getenv('VECTOR_SYNC_STATE_PATH', "cache/vector_sync.sqlite3")  # indexed row ids and content hashes
+VECTOR_REBUILD_AT = os.getenv('VECTOR_REBUILD_AT', "02:00")  # daily full rebuild time, empty to disable
+VECTOR_SYNC_EVERY_MINUTES = int(os.getenv('VECTOR_SYNC_EVERY_MINUTES', 0))  # incremental sync interval, 0 to disable
+VECTOR_JOB_LOCK_PATH = os.getenv('VECTOR_JOB_LOCK_PATH', "cache/vector_jobs.lock")  # keeps jobs from overlapping across workers
+
 ### log config ###
 LOG_FILE_PATH = "log/log.log"
 LOG_LEVEL = "info"
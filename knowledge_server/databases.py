@@ -3,6 +3,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 import dotenv
+from configs import DB_POOL_SIZE, DB_MAX_OVERFLOW
 
 # Load environment variables from .env file
 dotenv.load_dotenv()
@@ -18,8 +19,13 @@ engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     pool_pre_ping=True,  # 自动检测连接是否有效
     pool_recycle=3600,   # 避免 MySQL 自动断开连接
+    pool_size=DB_POOL_SIZE,        # 每个 worker 的连接池, 按 WORKERS 分配
+    max_overflow=DB_MAX_OVERFLOW,
 )
 
+# A forked worker must not reuse the parent's pooled connections; drop them without closing
+os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
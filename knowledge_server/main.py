@@ -1,6 +1,11 @@
+import time
+import json
 import uvicorn
-from fastapi import FastAPI, Request, Depends, HTTPException
-from app.chat.chat import ChatQuery
+from contextlib import asynccontextmanager
+from threading import Thread
+from fastapi import FastAPI, Request, Depends, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from configs import *
 from utils import get_logging
 from sqlalchemy.orm import Session
@@ -8,20 +13,49 @@ from app.knowledge import knowledge_crud as crud
 from app.knowledge import knowledge_schemas as schemas
 from app.knowledge import knowledge_models as models
 from databases import engine, get_db
-from app.knowledge.knowledge import ContentQuery
-from app.medical.diagnosis_standards import MedicalQuery
+from app.knowledge.vector_jobs import VectorJobConflict
+import services
+import metrics
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 from fastapi.middleware.cors import CORSMiddleware
 
-models.Base.metadata.create_all(bind=engine)  # 创建数据库表
+logger = get_logging(__file__)
+
+def pg_pool(content):
+    # the pgvector engine is created on the store's first query
+    engine = getattr(content.pg_vector_store, "_engine", None) if content is not None else None
+    return engine.pool if engine is not None else None
+
+metrics.instrument_engine(engine, "mysql")
+metrics.runtime.add_pool("mysql", lambda: engine.pool)
+metrics.runtime.add_pool("pgvector", lambda: pg_pool(services.content.instance))
+metrics.runtime.set_admission(lambda: services.llm_admission.instance)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Services are built lazily (see services.py), so startup does not wait on any backend
+    started = time.perf_counter()
+    try:
+        models.Base.metadata.create_all(bind=engine)  # 创建数据库表
+    except Exception as e:
+        logger.error(f"Error creating database tables: {e}")
+    if EAGER_SERVICES:
+        Thread(target=services.warm_up, daemon=True).start()
+    try:
+        services.vector_jobs.get().start_schedule(rebuild_at=VECTOR_REBUILD_AT, sync_every_minutes=VECTOR_SYNC_EVERY_MINUTES)
+    except Exception as e:
+        logger.error(f"Error starting vector schedule: {e}")
+    logger.info(f"Startup finished in {time.perf_counter() - started:.3f}s")
+    yield
+    if services.chat.instance is not None:
+        services.chat.instance.tracer.close()
+    if services.content.instance is not None:
+        await services.content.instance.rerank_client.aclose()
 
 # 创建FastAPI应用
-app = FastAPI()
-chat = ChatQuery()
-logger = get_logging(__file__)
-content = ContentQuery()
-medicalrag = MedicalQuery()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,33 +69,150 @@ app.add_middleware(
 async def read_root():
     return {"Hello": "World"}
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+@app.get("/health")
+async def health_endpoint():
+    return {service.name: service.status() for service in services.all_services}
+
 @app.post("/chat")
-async def chat_endpoint(request: Request):
+async def chat_endpoint(request: Request, chat=Depends(services.chat), admission=Depends(services.llm_admission), cache=Depends(services.response_cache)):
     data = await request.json()
     logger.info(f"入参: {data}")
     user_message = data.get("message", "")
     if not user_message:
         return {"error": "No message provided"}
     
-    response = chat.chat_query(user_message)
+    async def generate():
+        async with admission.slot(CHAT_PRIORITY):
+            return await run_in_threadpool(chat.chat_query, user_message)
+    response = await cached_answer(cache, "chat", MODEL_NAME, chat.llm.temperature, user_message, CHAT_CACHE_TTL, generate)
     return {"response": response}
 
 @app.post("/chat_no_think")
-async def chat_no_think_endpoint(request: Request):
+async def chat_no_think_endpoint(request: Request, chat=Depends(services.chat), admission=Depends(services.llm_admission), cache=Depends(services.response_cache)):
     data = await request.json()
     logger.info(f"入参: {data}")
     user_message = data.get("message", "")
     if not user_message:
         return {"error": "No message provided"}
     
-    response = chat.chat_query_no_think(user_message)
+    async def generate():
+        async with admission.slot(CHAT_PRIORITY):
+            return await run_in_threadpool(chat.chat_query_no_think, user_message)
+    response = await cached_answer(cache, "chat_no_think", MODEL_NAME, chat.llm_2.temperature, user_message, CHAT_CACHE_TTL, generate)
     return {"response": response}
 
+async def response_embedding(query: str):
+    """
+    Query embedding for the semantic cache tier, only when the content service is already up.
+    """
+    content = services.content.instance
+    if content is None:
+        return None
+    try:
+        return (await content.aquery_bundle(query)).embedding
+    except Exception as e:
+        logger.error(f"Error embedding query for the response cache: {e}")
+        return None
+
+async def cached_answer(cache, namespace: str, model: str, temperature: float, prompt: str, ttl: float, generate, cacheable=None):
+    """
+    Answer from the exact tier, then the semantic tier, and only then call generate() and cache its result,
+    unless cacheable() says the answer was degraded.
+    """
+    if not RESPONSE_CACHE_ENABLED:
+        return await generate()
+    cache_name = namespace.split(":")[0]
+    response = cache.get(namespace, model, temperature, prompt)
+    if response is not None:
+        metrics.cache_requests.labels(f"response_{cache_name}", "exact_hit").inc()
+        return response
+    embedding = await response_embedding(prompt)
+    response = cache.get_similar(namespace, model, temperature, prompt, embedding)
+    if response is not None:
+        metrics.cache_requests.labels(f"response_{cache_name}", "semantic_hit").inc()
+    else:
+        metrics.cache_requests.labels(f"response_{cache_name}", "miss").inc()
+        response = await generate()
+        if cacheable is not None and not cacheable():
+            return response
+        cache.put(namespace, model, temperature, prompt, response, embedding=embedding, ttl=ttl)
+    return response
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    Holds the admission slot taken by the endpoint until the response is finished, also when
+    the client is gone before the body is iterated at all.
+    """
+    def __init__(self, content, admission, **kwargs) -> None:
+        super().__init__(content, **kwargs)
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.admission.release()
+
+async def sse_stream(request: Request, deltas):
+    """
+    Forward text deltas as server-sent events; stops the LLM stream when the client disconnects.
+    """
+    try:
+        async for delta in deltas:
+            if await request.is_disconnected():
+                logger.info("Client disconnected, chat stream cancelled")
+                return
+            yield f"data: {json.dumps({'delta': delta}, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+    except Exception as e:
+        logger.error(f"Error streaming chat: {e}")
+        yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+    finally:
+        await deltas.aclose()
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: Request, chat=Depends(services.chat), admission=Depends(services.llm_admission)):
+    data = await request.json()
+    logger.info(f"入参: {data}")
+    user_message = data.get("message", "")
+    if not user_message:
+        return {"error": "No message provided"}
+
+    await admission.acquire(CHAT_PRIORITY)
+    deltas = chat.astream_chat_query(user_message, think=True)
+    return AdmittedStreamingResponse(sse_stream(request, deltas), admission, media_type="text/event-stream")
+
+@app.post("/chat_no_think/stream")
+async def chat_no_think_stream_endpoint(request: Request, chat=Depends(services.chat), admission=Depends(services.llm_admission)):
+    data = await request.json()
+    logger.info(f"入参: {data}")
+    user_message = data.get("message", "")
+    if not user_message:
+        return {"error": "No message provided"}
+
+    await admission.acquire(CHAT_PRIORITY)
+    deltas = chat.astream_chat_query(user_message, think=False)
+    return AdmittedStreamingResponse(sse_stream(request, deltas), admission, media_type="text/event-stream")
+
+
+def sync_vector_task():
+    # through the job runner, so the sync never overlaps a rebuild in any worker
+    try:
+        services.vector_jobs.get().request_sync()
+    except Exception as e:
+        logger.error(f"Error syncing vectors: {e}")
 
 ## database crud operations
 @app.post("/knowledge/diagnosis_standards/", response_model=schemas.DiagnosisStandard)
-async def create_diagnosis_standard(diagnosis: schemas.DiagnosisStandardCreate, db: Session = Depends(get_db)):
-    return crud.create_diagnosis_standard(db, diagnosis)
+async def create_diagnosis_standard(diagnosis: schemas.DiagnosisStandardCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    db_diagnosis = crud.create_diagnosis_standard(db, diagnosis)
+    background_tasks.add_task(sync_vector_task)
+    return db_diagnosis
 
 @app.get("/knowledge/diagnosis_standards/", response_model=list[schemas.DiagnosisStandard])
 async def read_diagnosis_standards(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
@@ -75,17 +226,19 @@ async def read_diagnosis_standard(diagnosis_id: int, db: Session = Depends(get_d
     return db_diagnosis
 
 @app.put("/knowledge/diagnosis_standards/{diagnosis_id}", response_model=schemas.DiagnosisStandard)
-async def update_diagnosis_standard(diagnosis_id: int, diagnosis: schemas.DiagnosisStandardBase, db: Session = Depends(get_db)):
+async def update_diagnosis_standard(diagnosis_id: int, diagnosis: schemas.DiagnosisStandardBase, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     db_diagnosis = crud.update_diagnosis_standard(db, diagnosis_id, diagnosis)
     if not db_diagnosis:
         raise HTTPException(status_code=404, detail="Diagnosis standard not found")
+    background_tasks.add_task(sync_vector_task)
     return db_diagnosis
 
 @app.delete("/knowledge/diagnosis_standards/{diagnosis_id}", response_model=schemas.DiagnosisStandard)
-async def delete_diagnosis_standard(diagnosis_id: int, db: Session = Depends(get_db)):
+async def delete_diagnosis_standard(diagnosis_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     db_diagnosis = crud.delete_diagnosis_standard(db, diagnosis_id)
     if not db_diagnosis:
         raise HTTPException(status_code=404, detail="Diagnosis standard not found")
+    background_tasks.add_task(sync_vector_task)
     return db_diagnosis
 
 @app.get("/knowledge/tables")
@@ -112,17 +265,42 @@ async def get_database_table_schema_endpoint(table_name: str, db: Session = Depe
     schema_info = crud.get_table_data(table_name,db)
     return schema_info
 
-@app.put("/knowledge/build_vector")
-def build_vector_endpoint():
+@app.put("/knowledge/build_vector", status_code=202)
+def build_vector_endpoint(vector_jobs=Depends(services.vector_jobs)):
     try:
-        content.call_build_vector()
-        return {"status": "Vector built successfully"}
-    except Exception as e:
-        logger.error(f"Error initiating vector building: {e}")
-        raise HTTPException(status_code=500, detail="Error initiating vector building")
+        job = vector_jobs.submit("build")
+    except VectorJobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.to_dict()
+
+@app.put("/knowledge/sync_vector", status_code=202)
+def sync_vector_endpoint(vector_jobs=Depends(services.vector_jobs)):
+    try:
+        job = vector_jobs.submit("sync")
+    except VectorJobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.to_dict()
+
+@app.get("/knowledge/vector_jobs")
+def list_vector_jobs_endpoint(vector_jobs=Depends(services.vector_jobs)):
+    return vector_jobs.list()
+
+@app.get("/knowledge/vector_jobs/{job_id}")
+def read_vector_job_endpoint(job_id: str, vector_jobs=Depends(services.vector_jobs)):
+    job = vector_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Vector job not found")
+    return job
+
+@app.delete("/knowledge/vector_jobs/{job_id}")
+def cancel_vector_job_endpoint(job_id: str, vector_jobs=Depends(services.vector_jobs)):
+    job = vector_jobs.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Vector job not found")
+    return job
 
 @app.post("/knowledge/embed_search")
-async def embed_search_endpoint(request: Request):
+async def embed_search_endpoint(request: Request, content=Depends(services.content)):
     data = await request.json()
     logger.info(f"入参: {data}")
     query = data.get("query", "")
@@ -130,11 +308,46 @@ async def embed_search_endpoint(request: Request):
     if not query:
         return {"error": "No query provided"}
     
-    response = content.embed_search(query, top_k=top_k)
+    response = await content.aembed_search(query, top_k=top_k)
     return {"response": response}
 
 @app.post("/knowledge/qdrant_embed_search")
-async def embed_search_endpoint(request: Request):
+async def embed_search_endpoint(request: Request, content=Depends(services.content)):
+    data = await request.json()
+    logger.info(f"入参: {data}")
+    query = data.get("query", "")
+    top_k = data.get("top_k", 5)
+    if not query:
+        return {"error": "No query provided"}
+    
+    response = await content.aqdrant_embed_search(query, top_k=top_k)
+    return {"response": response}
+@app.post("/knowledge/local_embed_search")
+async def local_embed_search_endpoint(request: Request, content=Depends(services.content)):
+    data = await request.json()
+    logger.info(f"入参: {data}")
+    query = data.get("query", "")
+    top_k = data.get("top_k", 5)
+    if not query:
+        return {"error": "No query provided"}
+    
+    response = await content.alocal_embed_search(query, top_k=top_k)
+    return {"response": response}
+
+@app.post("/knowledge/keyword_search")
+async def keyword_search_endpoint(request: Request, content=Depends(services.content)):
+    data = await request.json()
+    logger.info(f"入参: {data}")
+    query = data.get("query", "")
+    top_k = data.get("top_k", 5)
+    if not query:
+        return {"error": "No query provided"}
+    
+    response = content.keyword_search(query, top_k=top_k)
+    return {"response": response}
+
+@app.post("/knowledge/fused_search")
+async def fused_search_endpoint(request: Request, content=Depends(services.content)):
     data = await request.json()
     logger.info(f"入参: {data}")
     query = data.get("query", "")
@@ -142,10 +355,23 @@ async def embed_search_endpoint(request: Request):
     if not query:
         return {"error": "No query provided"}
     
-    response = content.qdrant_embed_search(query, top_k=top_k)
+    response = await content.afused_search(query, top_k=top_k)
     return {"response": response}
+
+@app.get("/admission_stats")
+async def admission_stats_endpoint(admission=Depends(services.llm_admission)):
+    return admission.stats()
+
+@app.get("/response_cache_stats")
+async def response_cache_stats_endpoint(cache=Depends(services.response_cache)):
+    return cache.stats()
+
+@app.get("/knowledge/query_cache_stats")
+async def query_cache_stats_endpoint(content=Depends(services.content)):
+    return content.query_embedding_cache.stats()
+
 @app.post("/knowledge/reranker_search")
-async def reranker_search_endpoint(request: Request):
+async def reranker_search_endpoint(request: Request, content=Depends(services.content)):
     data = await request.json()
     logger.info(f"入参: {data}")
     query = data.get("query", "")
@@ -154,36 +380,97 @@ async def reranker_search_endpoint(request: Request):
     if not query or not documents:
         return {"error": "No query or documents provided"}
     
-    response = content.reranker_result(query, documents, top_k=top_k)
+    response = await content.areranker_result(query, documents, top_k=top_k)
+    return {"response": response}
+
+class rerank_batch_item_json(BaseModel):
+    query: str
+    documents: List[str]
+class rerank_batch_request_json(BaseModel):
+    items: List[rerank_batch_item_json]
+    top_k: int = 3
+@app.post("/knowledge/reranker_search_batch")
+async def reranker_search_batch_endpoint(request: rerank_batch_request_json, content=Depends(services.content)):
+    logger.info(f"入参: {len(request.items)} rerank items")
+    if not request.items:
+        return {"error": "No items provided"}
+    response = await content.areranker_batch([(item.query, item.documents) for item in request.items], top_k=request.top_k)
     return {"response": response}
 
 class medical_rag_request_json(BaseModel):
     query:str
     embed_top_k:int
     rerank_top_k:int
+    retrieval: str = "qdrant"  # or "fused"
 @app.post("/medical/diagnosis_standards_rag")
-async def diagnosis_standards_rag_endpoint(request: medical_rag_request_json):
+async def diagnosis_standards_rag_endpoint(request: medical_rag_request_json, content=Depends(services.content), medicalrag=Depends(services.medical), cache=Depends(services.response_cache)):
     logger.info(f"入参: {request}")
     query = request.query
     embed_top_k = request.embed_top_k
     rerank_top_k = request.rerank_top_k
     if not query:
         return {"error": "No query provided"}
-    embed_results = content.qdrant_embed_search(query, top_k=embed_top_k)
-    rerank_results = content.reranker_result(query, [item.text for item in embed_results], top_k=rerank_top_k)
-    response = medicalrag.search_diagnosis_rag(query, embed_results, rerank_results)
+
+    degraded = []  # backends left out of this answer, such answers are not cached
+    async def generate():
+        # retrieval and rerank only, no LLM call, so no admission slot is taken
+        if request.retrieval == "fused":
+            embed_results = await content.afused_search(query, top_k=embed_top_k, dropped=degraded)
+        else:
+            embed_results = await content.aqdrant_embed_search(query, top_k=embed_top_k)
+        rerank_results = await content.areranker_scores(query, [item.text for item in embed_results], top_k=rerank_top_k)
+        if isinstance(rerank_results, dict):
+            degraded.append("rerank")
+        rerank_results = rerank_or_embed_order(rerank_results, embed_results, rerank_top_k)
+        return medicalrag.search_diagnosis_rag(query, embed_results, rerank_results)
+    # the sync generation is shared by all workers, so any build or sync retires cached answers
+    namespace = f"rag:{content.sync_state.generation()}:{request.retrieval}:{embed_top_k}:{rerank_top_k}"
+    response = await cached_answer(cache, namespace, f"{EMBEDDING_MODEL_NAME}+{RERANK_MODEL_NAME}", 0, query, RAG_CACHE_TTL, generate, cacheable=lambda: not degraded)
 
     return {"response": response}
 
+def rerank_or_embed_order(rerank_results, embed_results, rerank_top_k):
+    if isinstance(rerank_results, dict):
+        # rerank unavailable, fall back to the embedding order
+        return [(i, None) for i in range(min(rerank_top_k, len(embed_results)))]
+    return rerank_results
+
+class medical_rag_batch_request_json(BaseModel):
+    queries: List[str]
+    embed_top_k: int
+    rerank_top_k: int
+@app.post("/medical/diagnosis_standards_rag_batch")
+async def diagnosis_standards_rag_batch_endpoint(request: medical_rag_batch_request_json, content=Depends(services.content), medicalrag=Depends(services.medical)):
+    logger.info(f"入参: {len(request.queries)} queries")
+    queries = [query for query in request.queries if query]
+    if not queries:
+        return {"error": "No query provided"}
+    embed_results = await content.aqdrant_embed_search_batch(queries, top_k=request.embed_top_k)
+    rerank_results = await content.areranker_scores_batch(
+        [(query, [item.text for item in results]) for query, results in zip(queries, embed_results)],
+        top_k=request.rerank_top_k
+    )
+    response = []
+    for query, embeds, reranks in zip(queries, embed_results, rerank_results):
+        reranks = rerank_or_embed_order(reranks, embeds, request.rerank_top_k)
+        response.append({"query": query, "response": medicalrag.search_diagnosis_rag(query, embeds, reranks)})
+
+    return {"response": response}
+
+@app.get("/chat/trace_stats")
+async def trace_stats_endpoint(chat=Depends(services.chat)):
+    return chat.tracer.stats()
+
 @app.post("/chat/mlflow_test")
-async def mlflow_test_endpoint():
+async def mlflow_test_endpoint(chat=Depends(services.chat)):
     try:
-        chat.mlflow_test()
-        return {"status": "MLflow test executed successfully"}
+        metrics = await chat.amlflow_test()
+        return {"status": "MLflow test executed successfully", "metrics": metrics}
     except Exception as e:
         logger.error(f"Error executing MLflow test: {e}")
         raise HTTPException(status_code=500, detail="Error executing MLflow test")
 
 if __name__ == '__main__':
 
-    uvicorn.run(app, host='0.0.0.0', port=8001, workers=1)  # 在指定端口和主机上启动应用
\ No newline at end of file
+    # 多进程模式需要以导入字符串启动, 每个 worker 在自己的进程里创建客户端和连接池
+    uvicorn.run("main:app", host=SERVER_HOST, port=SERVER_PORT, workers=WORKERS)  # 在指定端口和主机上启动应用
\ No newline at end of file
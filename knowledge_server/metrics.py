@@ -0,0 +1,120 @@
+import os
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+
+# from a few milliseconds (cached lookups) up to an hour (full vector rebuilds)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+stage_seconds = Histogram("knowledge_stage_seconds", "Duration of a request or job stage", ["stage"], buckets=STAGE_BUCKETS)
+cache_requests = Counter("knowledge_cache_requests_total", "Cache lookups", ["cache", "result"])
+backend_errors = Counter("knowledge_backend_errors_total", "Failed backend calls", ["backend"])
+backend_timeouts = Counter("knowledge_backend_timeouts_total", "Backend calls that timed out", ["backend"])
+
+
+def count_error(backend: str, error: BaseException):
+    # httpx, requests, openai and asyncio all name their timeout errors *Timeout*
+    if "Timeout" in type(error).__name__:
+        backend_timeouts.labels(backend).inc()
+    else:
+        backend_errors.labels(backend).inc()
+
+
+@contextmanager
+def timed(stage: str, backend: str = None):
+    """
+    Observe the duration of the block in knowledge_stage_seconds; exceptions are counted against backend.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        if backend:
+            count_error(backend, e)
+        raise
+    finally:
+        stage_seconds.labels(stage).observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine, backend: str):
+    """
+    Time every statement of a SQLAlchemy engine as the db_query stage and count its errors.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stage_seconds.labels("db_query").observe(time.perf_counter() - conn.info["query_started"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
+        count_error(backend, context.original_exception)
+
+
+class RuntimeCollector:
+    """
+    Values read at scrape time from the serving worker: connection pool usage and the
+    admission queue. Sources return None while their service is not built yet.
+    """
+    def __init__(self) -> None:
+        self.pools = {}
+        self.admission = None
+
+    def add_pool(self, name: str, get_pool) -> None:
+        self.pools[name] = get_pool
+
+    def set_admission(self, get_admission) -> None:
+        self.admission = get_admission
+
+    def collect(self):
+        worker = str(os.getpid())
+        pools = GaugeMetricFamily("knowledge_db_pool_connections", "Database pool connections by state", labels=["pool", "state", "worker"])
+        for name, get_pool in self.pools.items():
+            try:
+                pool = get_pool()
+            except Exception:
+                pool = None
+            if not isinstance(pool, QueuePool):
+                continue
+            pools.add_metric([name, "size", worker], pool.size())
+            pools.add_metric([name, "checked_out", worker], pool.checkedout())
+            pools.add_metric([name, "idle", worker], pool.checkedin())
+            pools.add_metric([name, "overflow", worker], max(0, pool.overflow()))
+        yield pools
+
+        admission = self.admission() if self.admission else None
+        if admission is not None:
+            stats = admission.stats()
+            gauge = GaugeMetricFamily("knowledge_llm_admission", "LLM requests running and queued", labels=["state", "worker"])
+            gauge.add_metric(["active", worker], stats["active"])
+            gauge.add_metric(["queued", worker], stats["queued"])
+            yield gauge
+            shed = CounterMetricFamily("knowledge_llm_admission_shed", "LLM requests shed by admission control", labels=["reason", "worker"])
+            shed.add_metric(["queue_full", worker], stats["rejected"])
+            shed.add_metric(["queue_timeout", worker], stats["timed_out"])
+            yield shed
+
+
+runtime = RuntimeCollector()
+REGISTRY.register(runtime)
+
+
+def render():
+    """
+    Metrics in the Prometheus text format. With PROMETHEUS_MULTIPROC_DIR set (several workers),
+    histograms and counters are merged across the workers; runtime values come from the serving worker.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(runtime)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,129 @@
+import os
+import time
+from threading import Lock
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from utils import get_logging
+logger = get_logging(__file__)
+
+
+class LazyService:
+    """
+    Builds a service on first use and caches it. Heavy imports happen inside the factory.
+    A failed build is retried on the next use, so one backend being down only disables
+    the endpoints that depend on it. An instance built before a fork is dropped in the child,
+    so every worker builds its own clients and connection pools.
+    """
+    def __init__(self, name: str, factory) -> None:
+        self.name = name
+        self.factory = factory
+        self.build_seconds = None
+        self.error = None
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # the child of a fork runs a single thread here, so nothing can hold the new lock yet
+        self.instance = None
+        self.lock = Lock()
+
+    def get(self):
+        if self.instance is None:
+            with self.lock:
+                if self.instance is None:
+                    started = time.perf_counter()
+                    try:
+                        instance = self.factory()
+                    except Exception as e:
+                        self.error = str(e)
+                        logger.error(f"Failed to start {self.name} service: {e}")
+                        raise
+                    self.build_seconds = time.perf_counter() - started
+                    self.error = None
+                    self.instance = instance
+                    logger.info(f"Started {self.name} service in {self.build_seconds:.3f}s")
+        return self.instance
+
+    async def __call__(self):
+        """
+        FastAPI dependency, answers 503 when the service cannot be built. A built service is
+        returned on the event loop; only the first build goes to the threadpool.
+        """
+        if self.instance is not None:
+            return self.instance
+        try:
+            return await run_in_threadpool(self.get)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"{self.name} service unavailable: {e}")
+
+    def status(self):
+        if self.instance is not None:
+            state = "ready"
+        elif self.error is not None:
+            state = "failed"
+        else:
+            state = "not_started"
+        return {"status": state, "build_seconds": self.build_seconds, "error": self.error}
+
+
+def _build_chat():
+    from app.chat.chat import ChatQuery
+    return ChatQuery()
+
+
+def _build_content():
+    from app.knowledge.knowledge import ContentQuery
+    content = ContentQuery()
+    try:
+        content.sync_keyword_index()
+    except Exception as e:
+        logger.error(f"Error building keyword index: {e}")
+    return content
+
+
+def _build_medical():
+    from app.medical.diagnosis_standards import MedicalQuery
+    return MedicalQuery()
+
+
+def _build_vector_jobs():
+    from configs import VECTOR_JOB_LOCK_PATH, VECTOR_SYNC_STATE_PATH
+    from app.knowledge.vector_jobs import VectorJobRunner
+    return VectorJobRunner(content.get, lock_path=VECTOR_JOB_LOCK_PATH, state_path=VECTOR_SYNC_STATE_PATH)
+
+
+def _build_llm_admission():
+    from configs import LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT, LLM_RETRY_AFTER, WORKERS
+    from admission import AdmissionController
+    return AdmissionController(
+        max_concurrency=max(1, LLM_MAX_CONCURRENCY // WORKERS),
+        max_queue=LLM_MAX_QUEUE,
+        queue_timeout=LLM_QUEUE_TIMEOUT,
+        retry_after=LLM_RETRY_AFTER,
+    )
+
+
+def _build_response_cache():
+    from configs import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_SIMILARITY
+    from app.knowledge.response_cache import ResponseCache
+    return ResponseCache(max_size=RESPONSE_CACHE_SIZE, similarity_threshold=RESPONSE_CACHE_SIMILARITY)
+
+
+chat = LazyService("chat", _build_chat)
+content = LazyService("content", _build_content)
+medical = LazyService("medical", _build_medical)
+vector_jobs = LazyService("vector_jobs", _build_vector_jobs)
+llm_admission = LazyService("llm_admission", _build_llm_admission)
+response_cache = LazyService("response_cache", _build_response_cache)
+all_services = [chat, content, medical, vector_jobs]
+
+
+def warm_up():
+    """
+    Build every service, logging failures instead of raising.
+    """
+    for service in all_services:
+        try:
+            service.get()
+        except Exception:
+            pass
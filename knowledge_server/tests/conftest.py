@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the server modules import each other from the knowledge_server directory and write to
+# log/ and cache/ relative to it, so the tests run from there wherever pytest starts
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from admission import AdmissionController
+
+
+def test_queue_full_displaces_the_lowest_priority_waiter():
+    async def scenario():
+        admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=5)
+        await admission.acquire(priority=10)
+        low = asyncio.ensure_future(admission.acquire(priority=10))
+        await asyncio.sleep(0)
+        high = asyncio.ensure_future(admission.acquire(priority=0))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as shed:
+            await low
+        assert shed.value.status_code == 429
+        assert "Retry-After" in shed.value.headers
+        assert not high.done()
+        admission.release()
+        await high
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 1
+    assert stats["queued"] == 0
+    assert stats["rejected"] == 1
+
+
+def test_queue_full_sheds_a_newcomer_that_does_not_outrank_the_queue():
+    async def scenario():
+        admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=5)
+        await admission.acquire(priority=0)
+        waiter = asyncio.ensure_future(admission.acquire(priority=0))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException):
+            await admission.acquire(priority=0)
+        admission.release()
+        await waiter
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_sheds_the_waiter():
+    async def scenario():
+        admission = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout=0.05)
+        await admission.acquire()
+        with pytest.raises(HTTPException) as shed:
+            await admission.acquire()
+        assert shed.value.status_code == 429
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["timed_out"] == 1
+    assert stats["queued"] == 0
+    assert stats["active"] == 1
+
+
+def test_slot_context_releases_on_error():
+    async def scenario():
+        admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=1)
+        with pytest.raises(RuntimeError):
+            async with admission.slot():
+                raise RuntimeError("backend down")
+        async with admission.slot():
+            pass
+        return admission.stats()
+
+    assert asyncio.run(scenario())["active"] == 0
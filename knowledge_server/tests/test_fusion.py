@@ -0,0 +1,26 @@
+from llama_index.core.schema import NodeWithScore, TextNode
+from app.knowledge.fusion import reciprocal_rank_fusion
+
+
+def _ranking(*names):
+    return [NodeWithScore(node=TextNode(id_=f"{name}-{i}", text=name, metadata={"disease_name": name}), score=1.0)
+            for i, name in enumerate(names)]
+
+
+def test_rankings_are_merged_by_reciprocal_rank():
+    fused = reciprocal_rank_fusion({"qdrant": _ranking("a", "b", "c"), "keyword": _ranking("b")}, top_k=3, k=60)
+    assert [item.node.metadata["disease_name"] for item in fused] == ["b", "a", "c"]
+    assert fused[0].score == 1 / 62 + 1 / 61
+    assert fused[2].score == 1 / 63
+
+
+def test_results_are_deduped_by_disease_name():
+    fused = reciprocal_rank_fusion({"pgvector": _ranking("a", "a", "b")}, top_k=5, k=60)
+    assert [item.node.metadata["disease_name"] for item in fused] == ["a", "b"]
+    assert fused[0].node.node_id == "a-0"
+    assert fused[0].score == 1 / 61 + 1 / 62
+
+
+def test_top_k_and_empty_rankings():
+    assert len(reciprocal_rank_fusion({"qdrant": _ranking("a", "b", "c")}, top_k=2)) == 2
+    assert reciprocal_rank_fusion({}, top_k=5) == []
@@ -0,0 +1,35 @@
+from app.knowledge.keyword_index import KeywordIndex
+
+
+def _index(rows):
+    index = KeywordIndex()
+    for row_id, text in rows.items():
+        index.add(row_id, f"h{row_id}", text, {"id": f"{row_id}b", "text": text, "metadata": {}})
+    return index
+
+
+def test_search_after_update_returns_full_top_k():
+    index = _index({0: "胸痛 三天", 1: "胸痛 伴气短", 2: "头痛", 3: "腹痛", 4: "咳嗽"})
+    index.add(0, "h0-new", "胸痛 加重", {"id": "0b", "text": "胸痛 加重", "metadata": {}})
+    results = index.search("胸痛", top_k=2)
+    assert sorted(item.node.node_id for item in results) == ["0b", "1b"]
+
+
+def test_updated_rows_do_not_skew_document_frequency():
+    index = _index({row_id: f"胸痛 病例{row_id}" for row_id in range(5)})
+    index.add(0, "h0-new", "胸痛 病例0 更新", {"id": "0b", "text": "", "metadata": {}})
+    index.add(1, "h1-new", "胸痛 病例1 更新", {"id": "1b", "text": "", "metadata": {}})
+    index.add(5, "h5", "腹泻", {"id": "5b", "text": "", "metadata": {}})
+    results = index.search("胸痛", top_k=10)
+    assert len(results) == 5
+
+
+def test_removed_rows_are_not_returned():
+    index = _index({0: "胸痛", 1: "胸痛 气短"})
+    index.remove(0)
+    assert [item.node.node_id for item in index.search("胸痛", top_k=5)] == ["1b"]
+
+
+def test_empty_texts_do_not_break_scoring():
+    index = _index({0: "", 1: ""})
+    assert index.search("胸痛") == []
@@ -0,0 +1,54 @@
+from llama_index.core import Document
+from app.knowledge.local_vector_index import LocalVectorIndex
+
+
+def _documents(vectors):
+    documents = []
+    for i, vector in enumerate(vectors):
+        document = Document(id_=f"doc{i}", text=f"text {i}", metadata={"disease_name": f"d{i}"})
+        document.embedding = vector
+        documents.append(document)
+    return documents
+
+
+def test_search_ranks_by_cosine_similarity(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    index.build(_documents([[1.0, 0.0, 0.0], [0.0, 2.0, 0.0], [3.0, 3.0, 0.0]]))
+    results = index.search([0.0, 1.0, 0.0], top_k=2)
+    assert [item.node.node_id for item in results] == ["doc1", "doc2"]
+    assert results[0].score == 1.0
+    assert results[0].node.metadata == {"disease_name": "d1"}
+
+
+def test_top_k_is_clipped_to_the_index_size(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    index.build(_documents([[1.0, 0.0], [0.0, 1.0]]))
+    assert len(index.search([1.0, 1.0], top_k=10)) == 2
+
+
+def test_rebuild_by_another_process_is_reloaded(tmp_path):
+    writer = LocalVectorIndex(str(tmp_path))
+    writer.build(_documents([[1.0, 0.0]]))
+    reader = LocalVectorIndex(str(tmp_path))
+    assert reader.load()
+    assert len(reader) == 1
+    writer.build(_documents([[1.0, 0.0], [0.0, 1.0]]))
+    reader.checked_at = 0.0  # skip the one-second reload throttle
+    assert [item.node.node_id for item in reader.search([0.0, 1.0], top_k=1)] == ["doc1"]
+
+
+def test_not_built_index(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    assert not index.load()
+    assert len(index) == 0
+
+
+def test_empty_build_after_all_rows_are_removed(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    index.build(_documents([[1.0, 0.0]]))
+    index.build([])
+    assert len(index) == 0
+    assert index.search([1.0, 0.0]) == []
+    reloaded = LocalVectorIndex(str(tmp_path))
+    assert reloaded.load()
+    assert len(reloaded) == 0
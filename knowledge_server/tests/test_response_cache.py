@@ -0,0 +1,57 @@
+import numpy as np
+from app.knowledge.response_cache import ResponseCache
+
+EMBEDDING = np.array([1.0, 0.0, 0.0])
+NEAR = np.array([1.0, 0.05, 0.0])
+
+
+def test_exact_hit_ignores_case_and_whitespace():
+    cache = ResponseCache()
+    cache.put("chat", "m", 0.6, "Hello  World", "hi")
+    assert cache.get("chat", "m", 0.6, "hello world") == "hi"
+    assert cache.get("chat", "m", 0.7, "hello world") is None
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_semantic_hit_above_the_threshold():
+    cache = ResponseCache(similarity_threshold=0.95)
+    cache.put("rag:1", "m", 0, "胸痛怎么办", "answer", embedding=EMBEDDING)
+    assert cache.get_similar("rag:1", "m", 0, "胸口痛怎么办", NEAR) == "answer"
+    assert cache.get_similar("rag:1", "m", 0, "胸口痛怎么办", np.array([0.0, 1.0, 0.0])) is None
+    assert cache.get_similar("rag:2", "m", 0, "胸口痛怎么办", NEAR) is None
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["misses"]) == (1, 2)
+
+
+def test_semantic_tier_requires_the_same_numbers():
+    cache = ResponseCache(similarity_threshold=0.9)
+    cache.put("rag:1", "m", 0, "血压 150/110 怎么办", "urgent", embedding=EMBEDDING)
+    assert cache.get_similar("rag:1", "m", 0, "血压 110/70 怎么办", EMBEDDING) is None
+    assert cache.get_similar("rag:1", "m", 0, "血压150/110该怎么办", NEAR) == "urgent"
+
+
+def test_expired_entries_are_not_served():
+    cache = ResponseCache()
+    cache.put("chat", "m", 0, "q", "a", embedding=EMBEDDING, ttl=-1)
+    assert cache.get("chat", "m", 0, "q") is None
+    assert cache.get_similar("chat", "m", 0, "q", EMBEDDING) is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(max_size=2)
+    cache.put("chat", "m", 0, "first", 1, embedding=EMBEDDING)
+    cache.put("chat", "m", 0, "second", 2, embedding=NEAR)
+    assert cache.get("chat", "m", 0, "first") == 1
+    cache.put("chat", "m", 0, "third", 3)
+    assert cache.get("chat", "m", 0, "second") is None
+    assert cache.get_similar("chat", "m", 0, "other", NEAR) == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_partition_grows_past_its_initial_capacity():
+    cache = ResponseCache(similarity_threshold=0.99)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((20, 8))
+    for i, vector in enumerate(vectors):
+        cache.put("chat", "m", 0, f"question {chr(ord('a') + i)}", i, embedding=vector)
+    assert cache.get_similar("chat", "m", 0, "unseen", vectors[13]) == 13